@@ -0,0 +1,107 @@
+"""
+Benchmark of weather statistics computed with StatsService against
+ computing them row by row from history, as clients had to before.
+Usage: python benchmarks/stats_benchmark.py [number of snapshots]
+"""
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from core.database import Base  # noqa: E402
+from models.models import WeatherCacheDB  # noqa: E402
+from services.stats_service import StatsService  # noqa: E402
+
+FIELDS = ["temperature", "pressure", "humidity"]
+PERCENTILES = [50.0, 90.0]
+
+
+def seed(db, count: int):
+    """
+    Store snapshots of one location, one per minute.
+    :param db: db session.
+    :param count: number of snapshots.
+    :return: nothing
+    """
+    start = datetime(2020, 1, 1)
+    db.execute(insert(WeatherCacheDB), [
+        {"location": "moscow,ru", "timestamp": start + timedelta(minutes=i),
+         "temperature": (i * 7919) % 600 / 10 - 30,
+         "pressure": 980 + (i * 104729) % 60, "humidity": i % 101}
+        for i in range(count)
+    ])
+    db.commit()
+
+
+def per_row(db) -> dict:
+    """
+    Compute statistics from history rows converted to dicts.
+    :param db: db session.
+    :return: statistics by field.
+    """
+    rows = [row.to_dict() for row in
+            db.query(WeatherCacheDB).filter_by(location="moscow,ru")]
+    result = {}
+    for field in FIELDS:
+        values = sorted(row[field] for row in rows)
+        quantiles = statistics.quantiles(values, n=100, method="inclusive")
+        result[field] = {
+            "min": values[0], "max": values[-1],
+            "mean": statistics.fmean(values),
+            "std": statistics.pstdev(values),
+            "percentiles": {str(q): quantiles[int(q) - 1]
+                            for q in PERCENTILES},
+        }
+    return result
+
+
+def vectorized(db) -> dict:
+    """
+    Compute statistics with StatsService.
+    :param db: db session.
+    :return: statistics by field.
+    """
+    matrix = StatsService.load(db, "moscow,ru", FIELDS)
+    return StatsService.compute(matrix, FIELDS, PERCENTILES)
+
+
+def measure(function, db) -> float:
+    """
+    Measure the best of three runs of function.
+    :param function: function.
+    :param db: db session.
+    :return: seconds.
+    """
+    timings = []
+    for _ in range(3):
+        started = time.perf_counter()
+        function(db)
+        timings.append(time.perf_counter() - started)
+        db.expunge_all()
+    return min(timings)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{directory}/benchmark.db")
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        seed(db, count)
+        for name, function in (("per row", per_row),
+                               ("vectorized", vectorized)):
+            print(f"{name:>10}: {measure(function, db):.3f}s "
+                  f"for {count} snapshots")
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,51 @@ class Settings(BaseSettings):
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
     database_url: str = "sqlite:///./data/weather.db"
+    openweather_url: str = "http://api.openweathermap.org/data/2.5"
+    openweather_timeout: float = 10.0
+    openweather_connect_timeout: float = 5.0
+    openweather_max_connections: int = 100
+    openweather_max_keepalive_connections: int = 20
+    openweather_keepalive_expiry: float = 30.0
+    openweather_group_size: int = 20
+    openweather_failure_threshold: int = 5
+    openweather_reset_timeout_seconds: float = 30.0
+    weather_cache_ttl_minutes: int = 30
+    weather_cache_stale_ttl_minutes: int = 120
+    weather_cache_max_size: int = 1024
+    weather_not_found_ttl_seconds: float = 600.0
+    history_page_size: int = 100
+    history_max_page_size: int = 1000
+    export_batch_size: int = 1000
+    import_batch_size: int = 5000
+    import_commit_size: int = 100000
+    import_max_errors: int = 100
+    prefetch_enabled: bool = True
+    prefetch_interval_seconds: float = 60.0
+    prefetch_lead_seconds: float = 120.0
+    prefetch_spread_seconds: float = 30.0
+    prefetch_concurrency: int = 2
+    retention_enabled: bool = True
+    retention_interval_seconds: float = 3600.0
+    retention_batch_size: int = 1000
+    weather_raw_retention_days: int = 30
+    weather_hourly_retention_days: int = 365
+    notification_retention_days: int = 90
+    web_concurrency: int = 1
+    election_retry_seconds: float = 5.0
+    alert_engine_enabled: bool = True
+    alert_workers: int = 4
+    alert_executor_workers: int = 2
+    alert_batch_size: int = 500
+    alert_rate_window_seconds: float = 60.0
+    alert_outbox_poll_seconds: float = 5.0
+    alert_cooldown_seconds: float = 86400.0
+    alert_hysteresis: float = 1.0
+    alert_batch_wait_ms: float = 50.0
+    archive_enabled: bool = True
+    archive_interval_seconds: float = 3600.0
+    archive_after_days: int = 14
+    archive_batch_size: int = 5000
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -1,5 +1,5 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 from core.config import settings
 
 db_dir = settings.database_path
@@ -27,3 +27,74 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def init_db():
+    """
+    Create tables, columns and indexes that are missing in the database.
+    Columns and indexes are checked separately, because create_all skips
+     them for tables that already exist.
+    :return: nothing
+    """
+    enable_incremental_vacuum()
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def add_missing_columns():
+    """
+    Add columns declared in models but missing in existing tables.
+    New columns are nullable and empty in existing rows.
+    :return: nothing
+    """
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"]
+                        for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(
+                    f"ALTER TABLE {table.name} "
+                    f"ADD COLUMN {column.name} {column_type}"
+                ))
+
+
+def enable_incremental_vacuum():
+    """
+    Switch database to incremental auto vacuum, so that pages freed
+     by retention can be returned with PRAGMA incremental_vacuum.
+    Existing database has to be rebuilt with VACUUM once for it.
+    If database is locked, e.g. by another worker process starting
+     at the same time, it is tried again on the next start.
+    :return: nothing
+    """
+    try:
+        with engine.connect() as connection:
+            mode = connection.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+            if mode == 2:
+                return
+            connection.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+            if inspect(connection).get_table_names():
+                connection.exec_driver_sql("VACUUM")
+    except Exception as e:
+        print(f"Error enabling incremental vacuum: {e}")
+
+
+def incremental_vacuum(db: Session):
+    """
+    Return all free pages of database to the file system. Pending
+     changes are committed first. PRAGMA incremental_vacuum frees
+     one page per step and execute of the driver steps it only once,
+     so it is run with executescript, which steps it until it is done.
+    :param db: db session.
+    :return: nothing
+    """
+    db.commit()
+    connection = db.connection().connection.driver_connection
+    connection.executescript("PRAGMA incremental_vacuum")
@@ -1,7 +1,12 @@
+from sqlalchemy import null
+
 from core.database import SessionLocal
-from models.models import UserDB
+from models.models import (UserDB, SavedLocationDB, WeatherAlertDB,
+                           WeatherCacheDB, WeatherRollupDB)
 from dependencies.security import get_password_hash
 from core.config import settings
+from services.history_service import HistoryService
+from services.location_service import location_resolver
 
 
 def init_admin_user():
@@ -30,3 +35,65 @@ def init_admin_user():
         print(f"Error creating admin user: {e}")
     finally:
         db.close()
+
+
+def init_location_keys():
+    """
+    Function that fills location keys of alerts and saved locations
+     that were created before locations had keys.
+    :return: nothing
+    """
+    db = SessionLocal()
+    try:
+        for model in (WeatherAlertDB, SavedLocationDB):
+            for row in db.query(model).filter(model.location_key.is_(None)):
+                row.location_key = location_resolver.key_for(db, row.location)
+        db.commit()
+    except Exception as e:
+        print(f"Error filling location keys: {e}")
+    finally:
+        db.close()
+
+
+def init_rollups():
+    """
+    Function that builds rollups of weather history
+     that was stored before rollups existed.
+    :return: nothing
+    """
+    db = SessionLocal()
+    try:
+        if (db.query(WeatherRollupDB.id).first() is None
+                and db.query(WeatherCacheDB.id).first() is not None):
+            HistoryService.rebuild_rollups(db)
+            db.commit()
+    except Exception as e:
+        print(f"Error building rollups: {e}")
+    finally:
+        db.close()
+
+
+def init_weather_columns(batch_size: int = 1000):
+    """
+    Function that moves weather data stored as JSON
+     to typed columns of weather cache.
+    :param batch_size: number of snapshots migrated in one transaction.
+    :return: nothing
+    """
+    db = SessionLocal()
+    try:
+        while True:
+            rows = db.query(WeatherCacheDB).filter(
+                WeatherCacheDB.temperature.is_(None),
+                WeatherCacheDB.data.isnot(None)
+            ).limit(batch_size).all()
+            if not rows:
+                break
+            for row in rows:
+                row.fill(row.data)
+                row.data = null()
+            db.commit()
+    except Exception as e:
+        print(f"Error migrating weather data: {e}")
+    finally:
+        db.close()
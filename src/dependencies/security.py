@@ -98,3 +98,19 @@ async def get_current_user(
     if user is None:
         raise credentials_exception
     return user
+
+
+async def get_admin_user(
+        current_user: UserDB = Depends(get_current_user)
+):
+    """
+    Getting current user, if it is admin.
+    :param current_user: current user.
+    :return: user if it is admin
+    """
+    if current_user.username != settings.admin_username:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions",
+        )
+    return current_user
@@ -0,0 +1,40 @@
+"""
+Command line tool for importing historical weather observations.
+Usage: python import_history.py observations.ndjson [--replay-alerts]
+"""
+import argparse
+import json
+from pathlib import Path
+
+from core.database import SessionLocal, init_db
+from services.import_service import ImportService
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Import weather observations from NDJSON or CSV."
+    )
+    parser.add_argument("path", type=Path, help="file with observations")
+    parser.add_argument("--format", choices=("ndjson", "csv"),
+                        help="format of file, by default from extension")
+    parser.add_argument("--replay-alerts", action="store_true",
+                        help="evaluate alerts for imported observations")
+    args = parser.parse_args()
+    import_format = args.format or (
+        "csv" if args.path.suffix.lower() == ".csv" else "ndjson"
+    )
+
+    init_db()
+    db = SessionLocal()
+    try:
+        with args.path.open(encoding="utf-8", newline="") as stream:
+            result = ImportService(db, args.replay_alerts).import_rows(
+                ImportService.read(stream, import_format)
+            )
+    finally:
+        db.close()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,68 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from dotenv import load_dotenv
-from core.database import engine, Base
+from core.config import settings
+from core.database import init_db
 from routers import locations
 from routers import alerts, auth, weather
-from core.initial_data import init_admin_user
+from core.initial_data import (init_admin_user, init_location_keys,
+                               init_rollups, init_weather_columns)
+from services.archive_service import archive_service
+from services.election_service import ElectedServices
+from services.prefetch_service import PrefetchService
+from services.process_lock import ProcessLock
+from services.retention_service import RetentionService
 
 load_dotenv()
 
-Base.metadata.create_all(bind=engine)
+init_db()
 
 init_admin_user()
 
+init_location_keys()
+
+init_weather_columns()
+
+init_rollups()
+
+prefetch_service = PrefetchService(weather.weather_service)
+
+retention_service = RetentionService()
+
+maintenance_services = ElectedServices(
+    ProcessLock(settings.database_path / "maintenance.lock"),
+    [service for service, enabled in (
+        (prefetch_service, settings.prefetch_enabled),
+        (retention_service, settings.retention_enabled),
+        (archive_service, settings.archive_enabled),
+    ) if enabled]
+)
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    """
+    Lifespan of application, runs background services
+     and releases shared resources on shutdown. Prefetch, retention
+     and archive run only in the process holding maintenance lock.
+    :param _app: application.
+    """
+    if settings.alert_engine_enabled:
+        await weather.weather_service.service.start()
+    maintenance_services.start()
+    yield
+    await maintenance_services.stop()
+    await weather.weather_service.service.stop()
+    await weather.weather_service.close()
+
+
 app = FastAPI(
     title="Weather Monitoring App",
     description="An app to monitor weather conditions"
                 " with alerts and historical data",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 app.include_router(auth.router)
@@ -1,13 +1,14 @@
-from datetime import datetime
+from datetime import datetime, timezone
 
-from sqlalchemy import (Column, Integer, String,
-                        Boolean, DateTime, ForeignKey, JSON)
+from sqlalchemy import (Column, Integer, String, Float,
+                        Boolean, DateTime, ForeignKey, JSON, Index)
 from core.database import Base
 
 
 class UserDB(Base):
     """
-    User model in db.
+    User model in db. Notifications with id up to
+     notifications_read_id are read by user.
     """
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
@@ -16,6 +17,7 @@ class UserDB(Base):
     full_name = Column(String)
     hashed_password = Column(String)
     disabled = Column(Boolean, default=False)
+    notifications_read_id = Column(Integer)
 
 
 class SavedLocationDB(Base):
@@ -26,6 +28,7 @@ class SavedLocationDB(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     location = Column(String)
+    location_key = Column(String, index=True)
 
 
 class WeatherAlertDB(Base):
@@ -36,14 +39,56 @@ class WeatherAlertDB(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     location = Column(String)
+    location_key = Column(String, index=True)
     column_name = Column(String)
     comparator = Column(String)
     number = Column(Integer)
 
 
+class AlertLocationDB(Base):
+    """
+    Version of alerts of location in db. It is incremented in the
+     transaction that changes alerts of location, so that alert
+     engine running in another process loads them again.
+    """
+    __tablename__ = "alert_locations"
+    location_key = Column(String, primary_key=True)
+    version = Column(Integer, default=0)
+
+
+class AlertStateDB(Base):
+    """
+    State of alert in db, whether its condition held for the last
+     weather data and when it notified last time.
+    """
+    __tablename__ = "alert_states"
+    alert_id = Column(Integer, ForeignKey("weather_alerts.id"),
+                      primary_key=True)
+    active = Column(Boolean, default=False)
+    last_notified = Column(DateTime)
+
+
+class AlertOutboxDB(Base):
+    """
+    Stored snapshot waiting for evaluation of alerts in db.
+    Rows are written together with snapshots and deleted
+     in the transaction that evaluates them.
+    """
+    __tablename__ = "alert_outbox"
+    id = Column(Integer, primary_key=True)
+    snapshot_id = Column(Integer, ForeignKey("weather_cache.id"))
+    location = Column(String)
+    partition = Column(Integer)
+
+    __table_args__ = (
+        Index("ix_alert_outbox_partition_id", partition, id),
+    )
+
+
 class NotificationDB(Base):
     """
-    Notification model in db.
+    Notification model in db. Notifications of user are read
+     in order of id with (user_id, id) index.
     """
     __tablename__ = "weather_notifications"
     id = Column(Integer, primary_key=True, index=True)
@@ -53,18 +98,62 @@ class NotificationDB(Base):
     comparator = Column(String)
     number = Column(Integer)
     actual_number = Column(Integer)
-    timestamp = Column(DateTime)
+    timestamp = Column(DateTime, index=True)
+
+    __table_args__ = (
+        Index("ix_weather_notifications_user_id_id", user_id, id),
+    )
+
+
+class LocationAliasDB(Base):
+    """
+    Mapping of normalized location name to OpenWeather city id
+     and canonical location key in db.
+    """
+    __tablename__ = "location_aliases"
+    id = Column(Integer, primary_key=True, index=True)
+    alias = Column(String, unique=True, index=True)
+    city_id = Column(Integer, index=True)
+    location = Column(String)
 
 
 class WeatherCacheDB(Base):
     """
-    Cached weather model in db.
+    Cached weather model in db, with one column per weather data field.
+    Data column keeps JSON of snapshots stored before the typed columns
+     existed, until they are migrated.
     """
     __tablename__ = "weather_cache"
+    fields = ("main_weather", "icon", "description", "temperature",
+              "temperature_feels_like", "temperature_min", "temperature_max",
+              "pressure", "humidity", "visibility", "wind_speed", "wind_deg",
+              "lat", "lon", "sunrise", "sunset")
+
     id = Column(Integer, primary_key=True, index=True)
     location = Column(String)
     data = Column(JSON)
-    timestamp = Column(DateTime)
+    timestamp = Column(DateTime, index=True)
+    main_weather = Column(String)
+    icon = Column(String)
+    description = Column(String)
+    temperature = Column(Float)
+    temperature_feels_like = Column(Float)
+    temperature_min = Column(Float)
+    temperature_max = Column(Float)
+    pressure = Column(Float)
+    humidity = Column(Float)
+    visibility = Column(Float)
+    wind_speed = Column(Float)
+    wind_deg = Column(Float)
+    lat = Column(Float)
+    lon = Column(Float)
+    sunrise = Column(DateTime)
+    sunset = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_weather_cache_location_timestamp",
+              location, timestamp.desc()),
+    )
 
     def __init__(self, location: str, data: dict, timestamp: datetime):
         """
@@ -74,29 +163,93 @@ class WeatherCacheDB(Base):
         :param timestamp: timestamp
         """
         self.location = location.lower()
-        self.data = self.serialize_data(data)
         self.timestamp = timestamp
+        self.fill(data)
+
+    def fill(self, data: dict):
+        """
+        Set columns from weather data.
+        :param data: weather data
+        :return: nothing
+        """
+        for field in self.fields:
+            setattr(self, field, data.get(field))
+        self.sunrise = self.to_datetime(self.sunrise)
+        self.sunset = self.to_datetime(self.sunset)
 
     @staticmethod
-    def serialize_data(data: dict) -> dict:
+    def to_datetime(value):
         """
-        Convert datetime objects to ISO format strings for JSON serialization
-        :param data: data
-        :return: serialized data
+        Convert unix time or ISO format string to naive UTC datetime.
+        :param value: unix time, ISO format string or datetime
+        :return: datetime
+        """
+        if isinstance(value, (int, float)):
+            value = datetime.fromtimestamp(value, timezone.utc)
+        elif isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        if isinstance(value, datetime) and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+    def to_dict(self) -> dict:
         """
-        serialized = data.copy()
-        if ('timestamp' in serialized
-                and isinstance(serialized['timestamp'], datetime)):
-            serialized['timestamp'] = serialized['timestamp'].isoformat()
-        return serialized
+        Convert columns to weather data.
+        :return: weather data with timestamps in UTC.
+        """
+        weather_data = {field: getattr(self, field) for field in self.fields}
+        weather_data["location"] = self.location
+        for field in ("timestamp", "sunrise", "sunset"):
+            value = getattr(self, field)
+            weather_data[field] = (value.replace(tzinfo=timezone.utc)
+                                   if value is not None else None)
+        return weather_data
+
+
+class WeatherRollupDB(Base):
+    """
+    Hourly or daily aggregate of cached weather in db.
+    """
+    __tablename__ = "weather_rollups"
+    fields = ("temperature", "humidity", "pressure", "wind_speed")
+
+    id = Column(Integer, primary_key=True, index=True)
+    location = Column(String)
+    resolution = Column(String)
+    bucket = Column(DateTime)
+    count = Column(Integer)
+    temperature_min = Column(Float)
+    temperature_max = Column(Float)
+    temperature_sum = Column(Float)
+    humidity_min = Column(Float)
+    humidity_max = Column(Float)
+    humidity_sum = Column(Float)
+    pressure_min = Column(Float)
+    pressure_max = Column(Float)
+    pressure_sum = Column(Float)
+    wind_speed_min = Column(Float)
+    wind_speed_max = Column(Float)
+    wind_speed_sum = Column(Float)
+
+    __table_args__ = (
+        Index("ix_weather_rollups_location_resolution_bucket",
+              location, resolution, bucket, unique=True),
+    )
 
-    def deserialize_data(self) -> dict:
+    def to_dict(self) -> dict:
         """
-        Convert ISO format strings back to datetime objects when retrieving
-        :return: deserialized datetime.
+        Convert aggregate to min, max and mean of every field.
+        :return: aggregate.
         """
-        deserialized = self.data.copy()
-        if 'timestamp' in deserialized:
-            deserialized['timestamp'] = (
-                datetime.fromisoformat(deserialized['timestamp']))
-        return deserialized
+        rollup = {
+            "location": self.location,
+            "resolution": self.resolution,
+            "bucket": self.bucket,
+            "count": self.count,
+        }
+        for field in self.fields:
+            rollup[f"{field}_min"] = getattr(self, f"{field}_min")
+            rollup[f"{field}_max"] = getattr(self, f"{field}_max")
+            rollup[f"{field}_mean"] = (getattr(self, f"{field}_sum")
+                                       / self.count)
+        return rollup
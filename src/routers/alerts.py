@@ -1,12 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from starlette import status
 
 from core.database import get_db
-from schemas.schemas import (AlertCreate, AlertUpdate,
-                             AlertDelete, AlertGet, NotificationGet)
-from models.models import WeatherAlertDB, UserDB, NotificationDB
+from schemas.schemas import (AlertCreate, AlertUpdate, AlertDelete,
+                             AlertGet, AlertWorkerMetrics, NotificationGet,
+                             UnreadCount)
+from models.models import AlertStateDB, WeatherAlertDB, UserDB
+from core.config import settings
 from dependencies.security import get_current_user
+from services.alert_index import alert_index
+from services.alert_state import alert_states
+from services.location_service import location_resolver
+from services.notification_service import NotificationService
+from routers.weather import weather_service
 
 router = APIRouter(prefix="/alerts", tags=["alerts"])
 
@@ -38,12 +47,15 @@ async def create_alert(
         comparator=alert.comparator,
         user_id=current_user.id,
         location=alert.location,
+        location_key=location_resolver.key_for(db, alert.location),
         column_name=alert.column_name,
         number=alert.number,
     )
 
     db.add(new_alert)
+    versions = alert_index.touch(db, [new_alert.location_key])
     db.commit()
+    alert_index.add(new_alert, versions)
 
     return {"message": "Alert created successfully"}
 
@@ -78,12 +90,18 @@ async def update_alert(
             detail="Alert not found",
             headers={"WWW-Authenticate": "Bearer"})
 
+    old_key = alert_in_db.location_key
     alert_in_db.comparator = alert.comparator
     alert_in_db.location = alert.location
+    alert_in_db.location_key = location_resolver.key_for(db, alert.location)
     alert_in_db.column_name = alert.column_name
     alert_in_db.number = alert.number
+    db.query(AlertStateDB).filter_by(alert_id=alert.id).delete()
+    versions = alert_index.touch(db, [old_key, alert_in_db.location_key])
 
     db.commit()
+    alert_index.add(alert_in_db, versions)
+    alert_states.reset(alert.id)
 
     return {"message": "Alert edited successfully"}
 
@@ -112,7 +130,11 @@ async def delete_alert(
             headers={"WWW-Authenticate": "Bearer"})
 
     db.delete(alert_in_db)
+    db.query(AlertStateDB).filter_by(alert_id=alert_delete.id).delete()
+    versions = alert_index.touch(db, [alert_in_db.location_key])
     db.commit()
+    alert_index.remove(alert_delete.id, versions)
+    alert_states.reset(alert_delete.id)
 
     return {"message": "Alert deleted successfully"}
 
@@ -136,16 +158,78 @@ async def get_alerts(
 
 @router.get("/notifications", response_model=list[NotificationGet])
 async def get_notifications(
+    response: Response,
+    limit: int = Query(settings.history_page_size, ge=1,
+                       le=settings.history_max_page_size),
+    cursor: Optional[str] = None,
+    since: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: UserDB = Depends(get_current_user)
 ):
     """
-    Getting notifications.
+    Getting notifications, newest first. Cursor of the next page
+     of older notifications is returned in X-Next-Cursor header.
+    Cursor of the latest notification is returned in X-Latest-Cursor
+     header. Polling with it as since returns notifications added
+     after it from oldest to newest, at most limit of them,
+     and X-Latest-Cursor of the last returned one, so that every
+     notification is returned once when only since is followed.
+    :param response: response.
+    :param limit: maximum number of notifications.
+    :param cursor: cursor of page.
+    :param since: cursor of the latest notification client has.
     :param db: db session.
     :param current_user: current user.
     :return: list of notifications.
     """
-    alerts = db.query(NotificationDB).filter_by(
-        user_id=current_user.id
-    ).all()
-    return alerts
+    notifications, next_cursor, latest = NotificationService.get_page(
+        db, current_user.id, limit, cursor, since
+    )
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    if latest is not None:
+        response.headers["X-Latest-Cursor"] = latest
+    return notifications
+
+
+@router.get("/notifications/unread", response_model=UnreadCount)
+async def get_unread_notifications(
+    db: Session = Depends(get_db),
+    current_user: UserDB = Depends(get_current_user)
+):
+    """
+    Getting number of unread notifications.
+    :param db: db session.
+    :param current_user: current user.
+    :return: number of unread notifications.
+    """
+    return {"unread": NotificationService.count_unread(db, current_user)}
+
+
+@router.post("/notifications/read")
+async def read_notifications(
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: UserDB = Depends(get_current_user)
+):
+    """
+    Marking notifications up to notification of cursor as read.
+    :param cursor: cursor of notification, all are read if None.
+    :param db: db session.
+    :param current_user: current user.
+    :return: message
+    """
+    NotificationService.mark_read(db, current_user, cursor)
+    return {"message": "Notifications marked as read"}
+
+
+@router.get("/workers", response_model=list[AlertWorkerMetrics])
+def get_alert_workers(
+    _current_user: UserDB = Depends(get_current_user)
+):
+    """
+    Getting queue depth and processing rate of alert worker partitions.
+    :param _current_user: current user.
+    :return: list of metrics of partitions.
+    """
+    return weather_service.service.metrics()
@@ -5,6 +5,7 @@ from starlette import status
 from core.database import get_db
 from models.models import SavedLocationDB, UserDB
 from dependencies.security import get_current_user
+from services.location_service import location_resolver
 
 router = APIRouter(prefix="/locations", tags=["locations"])
 
@@ -30,7 +31,8 @@ async def save_location(
     if not existing:
         new_location = SavedLocationDB(
             user_id=current_user.id,
-            location=location
+            location=location,
+            location_key=location_resolver.key_for(db, location)
         )
         db.add(new_location)
         db.commit()
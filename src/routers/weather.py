@@ -1,56 +1,293 @@
-from typing import List
+import hashlib
+import io
+from datetime import datetime
+from typing import List, Optional, Union
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import (APIRouter, Depends, File, HTTPException, Query,
+                     Request, Response, UploadFile)
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func
 from sqlalchemy.orm import Session
+from core.config import settings
 from core.database import get_db
 from models.models import UserDB, WeatherCacheDB
-from schemas.schemas import WeatherData
-from dependencies.security import get_current_user
+from schemas.schemas import (ImportResult, WeatherData, WeatherRollup,
+                             WeatherStats)
+from dependencies.security import get_admin_user, get_current_user
+from services.history_service import HistoryService
+from services.import_service import ImportService
+from services.stats_service import StatsService
 from services.weather_service import WeatherService
 
 router = APIRouter(prefix="/weather", tags=["weather"])
 weather_service = WeatherService()
 
 
+def make_etag(*parts) -> str:
+    """
+    Function for making entity tag from parts that identify response.
+    :param parts: parts, e.g. location and snapshot timestamp.
+    :return: quoted entity tag.
+    """
+    digest = hashlib.sha256("|".join(map(str, parts)).encode())
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """
+    Function for checking if client already has response with entity tag.
+    :param request: request.
+    :param etag: entity tag of response.
+    :return: True if If-None-Match header matches entity tag, else False
+    """
+    header = request.headers.get("If-None-Match")
+    if header is None:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return "*" in tags or etag in tags
+
+
+def caching_headers(etag: str, max_age: float) -> dict:
+    """
+    Function for making caching headers of response.
+    :param etag: entity tag of response.
+    :param max_age: seconds for which response stays fresh.
+    :return: headers.
+    """
+    return {
+        "ETag": etag,
+        "Cache-Control": f"max-age={max(int(max_age), 0)}",
+    }
+
+
+@router.post("/import", response_model=ImportResult)
+def import_weather_history(
+    file: UploadFile = File(...),
+    import_format: str = Query("ndjson", alias="format",
+                               pattern="^(ndjson|csv)$"),
+    replay_alerts: bool = False,
+    db: Session = Depends(get_db),
+    _admin_user: UserDB = Depends(get_admin_user)
+):
+    """
+    Function for importing historical weather observations
+     from NDJSON or CSV file, only for admin. Invalid observations
+     are skipped and reported with their line numbers.
+    :param file: file with observations.
+    :param import_format: "ndjson" or "csv".
+    :param replay_alerts: evaluate alerts for imported observations.
+    :param db: db session.
+    :param _admin_user: current user, admin.
+    :return: numbers of imported and rejected observations
+    """
+    try:
+        stream = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+        return ImportService(db, replay_alerts).import_rows(
+            ImportService.read(stream, import_format)
+        )
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/{location}", response_model=WeatherData)
 async def get_weather(
     location: str,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     _current_user: UserDB = Depends(get_current_user)
 ):
     """
     Function for getting the most recent weather data for location.
+    Stale data that is being refreshed is marked
+     with X-Weather-Stale header. Response has entity tag
+     of the snapshot, so that clients can revalidate it.
     :param location: location.
+    :param request: request.
+    :param response: response.
     :param db: db session.
     :param _current_user: current user.
     :return: weather data
     """
     try:
-        return weather_service.get_weather_data(db, location)
+        snapshot = await weather_service.get_weather_snapshot(db, location)
+        headers = caching_headers(
+            make_etag(snapshot.data["location"], snapshot.timestamp),
+            0 if snapshot.stale
+            else weather_service.remaining_freshness(snapshot.timestamp)
+        )
+        if snapshot.stale:
+            headers["X-Weather-Stale"] = "true"
+        if is_not_modified(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        response.headers.update(headers)
+        return snapshot.data
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/{location}/history", response_model=List[WeatherData])
+@router.get("/{location}/history",
+            response_model=Union[List[WeatherData], List[WeatherRollup]])
 async def get_weather_history(
     location: str,
+    request: Request,
+    response: Response,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    limit: int = Query(settings.history_page_size, ge=1,
+                       le=settings.history_max_page_size),
+    cursor: Optional[str] = None,
+    resolution: str = Query("raw", pattern="^(raw|hour|day)$"),
     db: Session = Depends(get_db),
     _current_user: UserDB = Depends(get_current_user)
 ):
     """
-    Function for getting history of weather data for location.
+    Function for getting history of weather data for location,
+     ordered by time, as raw snapshots or as hourly or daily
+     aggregates. Cursor of the next page is returned
+     in X-Next-Cursor header. Response has entity tag made of ids
+     and timestamps of rows of the page, so that clients can
+     revalidate it.
     :param location: location.
+    :param request: request.
+    :param response: response.
+    :param start: beginning of time range, inclusive.
+    :param end: end of time range, exclusive.
+    :param limit: maximum number of snapshots.
+    :param cursor: cursor of page.
+    :param resolution: "raw", "hour" or "day".
     :param db: db session.
     :param _current_user: current user.
     :return: history of weather data
     """
     try:
-        weather_service.get_weather_data(db, location)
+        await weather_service.get_weather_data(db, location)
+        key = weather_service.resolver.key_for(db, location)
+
+        rows, next_cursor = HistoryService.get_page(
+            db, key, start, end, limit, cursor, resolution
+        )
+        latest = db.query(func.max(WeatherCacheDB.timestamp)).filter_by(
+            location=key
+        ).scalar()
+        headers = caching_headers(
+            make_etag(key, request.url.query, *[
+                (row.id, getattr(row, "timestamp", None),
+                 getattr(row, "count", None)) for row in rows
+            ]),
+            weather_service.remaining_freshness(latest) if latest else 0
+        )
+        if is_not_modified(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+
+        if next_cursor is not None:
+            headers["X-Next-Cursor"] = next_cursor
+        response.headers.update(headers)
+        return [row.to_dict() for row in rows]
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{location}/stats", response_model=WeatherStats)
+async def get_weather_stats(
+    location: str,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    fields: List[str] = Query(["temperature", "pressure", "humidity"]),
+    percentiles: List[float] = Query([50.0, 90.0]),
+    db: Session = Depends(get_db),
+    _current_user: UserDB = Depends(get_current_user)
+):
+    """
+    Function for getting min, max, mean, standard deviation
+     and percentiles of weather data fields for location over time range.
+    :param location: location.
+    :param start: beginning of time range, inclusive.
+    :param end: end of time range, exclusive.
+    :param fields: fields, e.g. temperature.
+    :param percentiles: percentiles from 0 to 100.
+    :param db: db session.
+    :param _current_user: current user.
+    :return: statistics of weather data
+    """
+    try:
+        StatsService.check_request(fields, percentiles)
+        await weather_service.get_weather_data(db, location)
+        key = weather_service.resolver.key_for(db, location)
+        matrix = StatsService.load(db, key, fields, start, end)
+        return {
+            "location": key,
+            "count": len(matrix),
+            "start": start,
+            "end": end,
+            "stats": StatsService.compute(matrix, fields, percentiles),
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def stream_history(key: str, start: Optional[datetime],
+                   end: Optional[datetime], export_format: str):
+    """
+    Generator for streaming exported history. It uses its own db session,
+     because session of request is closed before response is sent.
+    :param key: canonical location key.
+    :param start: beginning of time range, inclusive.
+    :param end: end of time range, exclusive.
+    :param export_format: "ndjson" or "csv".
+    :return: chunks of exported history.
+    """
+    db = weather_service.session_factory()
+    try:
+        snapshots = HistoryService.iter_rows(db, key, start, end,
+                                             settings.export_batch_size)
+        yield from HistoryService.export(snapshots, export_format,
+                                         settings.export_batch_size)
+    finally:
+        db.close()
 
-        weather_history = db.query(WeatherCacheDB).filter_by(
-            location=location.lower()
-        ).all()
 
-        return [i.data for i in weather_history]
+@router.get("/{location}/export")
+async def export_weather_history(
+    location: str,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    export_format: str = Query("ndjson", alias="format",
+                               pattern="^(ndjson|csv)$"),
+    db: Session = Depends(get_db),
+    _current_user: UserDB = Depends(get_current_user)
+):
+    """
+    Function for exporting whole history of weather data for location
+     as NDJSON or CSV. Rows are streamed as they are read from db.
+    :param location: location.
+    :param start: beginning of time range, inclusive.
+    :param end: end of time range, exclusive.
+    :param export_format: "ndjson" or "csv".
+    :param db: db session.
+    :param _current_user: current user.
+    :return: streaming response with history
+    """
+    try:
+        await weather_service.get_weather_data(db, location)
+        key = weather_service.resolver.key_for(db, location)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+    media_type = ("text/csv" if export_format == "csv"
+                  else "application/x-ndjson")
+    filename = f"{key.replace(',', '_')}.{export_format}"
+    return StreamingResponse(
+        stream_history(key, start, end, export_format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
@@ -1,5 +1,5 @@
-from datetime import datetime
-from pydantic import BaseModel, Field
+from datetime import datetime, timezone
+from pydantic import BaseModel, Field, field_validator
 from typing import Optional
 
 
@@ -20,26 +20,119 @@ class TokenData(BaseModel):
 
 class WeatherData(BaseModel):
     """
-    Schema for weather data.
+    Schema for weather data. Fields that imported observations
+     may omit are optional.
     """
     location: str
-    main_weather: str
-    icon: str
-    description: str
+    main_weather: Optional[str] = None
+    icon: Optional[str] = None
+    description: Optional[str] = None
     temperature: float
-    temperature_feels_like: float
-    temperature_min: float
-    temperature_max: float
+    temperature_feels_like: Optional[float] = None
+    temperature_min: Optional[float] = None
+    temperature_max: Optional[float] = None
     pressure: float
     humidity: float
-    visibility: float
+    visibility: Optional[float] = None
     wind_speed: float
-    wind_deg: float
+    wind_deg: Optional[float] = None
+    timestamp: datetime
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    sunrise: Optional[datetime] = None
+    sunset: Optional[datetime] = None
+
+
+class WeatherObservation(BaseModel):
+    """
+    Schema for imported weather observation.
+    """
+    location: str = Field(min_length=1)
     timestamp: datetime
-    lat: float
-    lon: float
-    sunrise: datetime
-    sunset: datetime
+    temperature: float
+    pressure: float
+    humidity: float
+    wind_speed: float
+    main_weather: Optional[str] = None
+    icon: Optional[str] = None
+    description: Optional[str] = None
+    temperature_feels_like: Optional[float] = None
+    temperature_min: Optional[float] = None
+    temperature_max: Optional[float] = None
+    visibility: Optional[float] = None
+    wind_deg: Optional[float] = None
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    sunrise: Optional[datetime] = None
+    sunset: Optional[datetime] = None
+
+    @field_validator("timestamp")
+    @classmethod
+    def check_timestamp(cls, value: datetime) -> datetime:
+        """
+        Reject observations from the future, which would become
+         the latest weather data of location.
+        :param value: timestamp, naive values are treated as UTC.
+        :return: timestamp
+        """
+        aware = (value if value.tzinfo is not None
+                 else value.replace(tzinfo=timezone.utc))
+        if aware > datetime.now(timezone.utc):
+            raise ValueError("timestamp is in the future")
+        return value
+
+
+class ImportResult(BaseModel):
+    """
+    Schema for result of importing weather observations.
+    """
+    imported: int
+    rejected: int
+    errors: list[dict]
+
+
+class WeatherRollup(BaseModel):
+    """
+    Schema for hourly or daily aggregate of weather data.
+    """
+    location: str
+    resolution: str
+    bucket: datetime
+    count: int
+    temperature_min: float
+    temperature_max: float
+    temperature_mean: float
+    humidity_min: float
+    humidity_max: float
+    humidity_mean: float
+    pressure_min: float
+    pressure_max: float
+    pressure_mean: float
+    wind_speed_min: float
+    wind_speed_max: float
+    wind_speed_mean: float
+
+
+class FieldStats(BaseModel):
+    """
+    Schema for statistics of one weather data field.
+    """
+    min: Optional[float] = None
+    max: Optional[float] = None
+    mean: Optional[float] = None
+    std: Optional[float] = None
+    percentiles: dict[str, Optional[float]] = {}
+
+
+class WeatherStats(BaseModel):
+    """
+    Schema for statistics of weather data over time range.
+    """
+    location: str
+    count: int
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    stats: dict[str, FieldStats]
 
 
 class AlertBase(BaseModel):
@@ -61,6 +154,25 @@ class NotificationGet(AlertBase):
     timestamp: datetime
 
 
+class UnreadCount(BaseModel):
+    """
+    Schema for number of unread notifications.
+    """
+    unread: int
+
+
+class AlertWorkerMetrics(BaseModel):
+    """
+    Schema for metrics of alert worker partition.
+    """
+    partition: int
+    queue_depth: int
+    outbox_depth: int
+    processed: int
+    batches: int
+    rate: float
+
+
 class AlertCreate(AlertBase):
     """
     Schema for creating alerts.
@@ -0,0 +1,305 @@
+import bisect
+import threading
+from typing import Iterable, NamedTuple, Optional
+
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from models.models import AlertLocationDB, WeatherAlertDB
+
+
+class AlertRule(NamedTuple):
+    """
+    Alert kept in index.
+    """
+    id: int
+    user_id: int
+    location: str
+    location_key: str
+    column_name: str
+    comparator: str
+    number: float
+
+
+class AlertIndex:
+    """
+    In-memory index of alerts. For every location, column and comparator
+     thresholds are kept sorted, so that alerts triggered by a value
+     are found with bisect. Alerts of a location are loaded from db
+     the first time location is matched and kept up to date by routes.
+    Routes also increment version of location in db, so that
+     locations changed by another process are found with stale
+     and loaded again, while changes of this process are recorded
+     with their versions and don't cause reloading.
+    """
+    def __init__(self):
+        """
+        Initialization of index.
+        """
+        self._rules = {}
+        self._locations = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def to_rule(alert: WeatherAlertDB) -> AlertRule:
+        """
+        Convert alert from db to rule.
+        :param alert: alert.
+        :return: rule.
+        """
+        return AlertRule(alert.id, alert.user_id, alert.location,
+                         alert.location_key, alert.column_name,
+                         alert.comparator, alert.number)
+
+    def match(self, db: Session, weather_data: dict) -> list[tuple]:
+        """
+        Get alerts triggered by weather data.
+        :param db: db session, used if location isn't loaded yet.
+        :param weather_data: weather data.
+        :return: list of rules and actual values of their columns.
+        """
+        key = weather_data["location"]
+        with self._lock:
+            loaded = key in self._locations
+        if not loaded:
+            self.load(db, key)
+
+        matched = []
+        with self._lock:
+            columns = self._locations.get(key, {})
+            for column, comparators in columns.items():
+                actual = weather_data.get(column)
+                if actual is None:
+                    continue
+                for comparator, (numbers, rules) in comparators.items():
+                    matched += [(rule, actual) for rule in
+                                self.triggered(comparator, numbers,
+                                               rules, actual)]
+        return matched
+
+    @staticmethod
+    def triggered(comparator: str, numbers: list, rules: list,
+                  actual: float) -> list[AlertRule]:
+        """
+        Get rules whose comparison of actual value with their number holds.
+        :param comparator: comparator.
+        :param numbers: sorted numbers of rules.
+        :param rules: rules in the same order.
+        :param actual: actual value.
+        :return: triggered rules.
+        """
+        if comparator == ">":
+            return rules[:bisect.bisect_left(numbers, actual)]
+        if comparator == ">=":
+            return rules[:bisect.bisect_right(numbers, actual)]
+        if comparator == "<":
+            return rules[bisect.bisect_right(numbers, actual):]
+        if comparator == "<=":
+            return rules[bisect.bisect_left(numbers, actual):]
+        return []
+
+    @staticmethod
+    def holds(comparator: str, actual: float, number: float) -> bool:
+        """
+        Check comparison of actual value with number.
+        :param comparator: comparator.
+        :param actual: actual value.
+        :param number: number of alert.
+        :return: True if comparison holds, else False
+        """
+        if comparator == ">":
+            return actual > number
+        if comparator == ">=":
+            return actual >= number
+        if comparator == "<":
+            return actual < number
+        if comparator == "<=":
+            return actual <= number
+        return False
+
+    def rule(self, alert_id: int) -> Optional[AlertRule]:
+        """
+        Get rule of alert.
+        :param alert_id: id of alert.
+        :return: rule or None if alert isn't in index.
+        """
+        with self._lock:
+            return self._rules.get(alert_id)
+
+    def load(self, db: Session, key: str):
+        """
+        Load alerts of location from db.
+        :param db: db session.
+        :param key: location key.
+        :return: nothing
+        """
+        self.load_many(db, [key])
+
+    def load_many(self, db: Session, keys: Iterable[str]):
+        """
+        Load alerts of locations that aren't loaded yet with one query.
+        Lock is held while querying, so that alerts added by routes
+         meanwhile aren't missed.
+        :param db: db session.
+        :param keys: location keys.
+        :return: nothing
+        """
+        with self._lock:
+            missing = [key for key in keys if key not in self._locations]
+            if not missing:
+                return
+            versions = self.versions(db, missing)
+            alerts = db.query(WeatherAlertDB).filter(
+                WeatherAlertDB.location_key.in_(missing)
+            ).all()
+            for key in missing:
+                self._locations[key] = {}
+                self._versions[key] = versions.get(key, 0)
+            for alert in alerts:
+                self._insert(self.to_rule(alert))
+
+    @staticmethod
+    def versions(db: Session, keys: Iterable[str]) -> dict:
+        """
+        Get versions of alerts of locations from db.
+        :param db: db session.
+        :param keys: location keys.
+        :return: versions by location key, locations whose alerts
+         never changed are missing.
+        """
+        return dict(db.query(
+            AlertLocationDB.location_key, AlertLocationDB.version
+        ).filter(AlertLocationDB.location_key.in_(list(keys))).all())
+
+    def stale(self, db: Session, keys: Iterable[str]) -> list[str]:
+        """
+        Get loaded locations whose alerts were changed since loading,
+         with one query.
+        :param db: db session.
+        :param keys: location keys.
+        :return: location keys.
+        """
+        with self._lock:
+            loaded = [key for key in keys if key in self._versions]
+        if not loaded:
+            return []
+        versions = self.versions(db, loaded)
+        with self._lock:
+            return [key for key in loaded
+                    if key in self._versions
+                    and versions.get(key, 0) != self._versions[key]]
+
+    @staticmethod
+    def touch(db: Session, keys: Iterable[str]) -> dict:
+        """
+        Increment versions of alerts of locations. Changes are not
+         committed, so that versions change with alerts.
+        :param db: db session.
+        :param keys: location keys.
+        :return: new versions by location key.
+        """
+        statement = insert(AlertLocationDB)
+        return {
+            key: db.execute(statement.values(location_key=key, version=1)
+                            .on_conflict_do_update(
+                                index_elements=["location_key"],
+                                set_={"version": AlertLocationDB.version + 1}
+                            ).returning(AlertLocationDB.version)).scalar_one()
+            for key in set(keys)
+        }
+
+    def add(self, alert: WeatherAlertDB, versions: Optional[dict] = None):
+        """
+        Add created or updated alert to index, if its location is loaded.
+        :param alert: alert.
+        :param versions: versions committed with the change,
+         returned by touch.
+        :return: nothing
+        """
+        rule = self.to_rule(alert)
+        with self._lock:
+            self._remove(rule.id)
+            if rule.location_key in self._locations:
+                self._insert(rule)
+            self._record(versions or {})
+
+    def remove(self, alert_id: int, versions: Optional[dict] = None):
+        """
+        Remove alert from index.
+        :param alert_id: id of alert.
+        :param versions: versions committed with the change,
+         returned by touch.
+        :return: nothing
+        """
+        with self._lock:
+            self._remove(alert_id)
+            self._record(versions or {})
+
+    def invalidate(self, key: str):
+        """
+        Forget alerts of location, they are loaded again when needed.
+        :param key: location key.
+        :return: nothing
+        """
+        with self._lock:
+            self._versions.pop(key, None)
+            for column in self._locations.pop(key, {}).values():
+                for _, rules in column.values():
+                    for rule in rules:
+                        self._rules.pop(rule.id, None)
+
+    def clear(self):
+        """
+        Forget all alerts.
+        :return: nothing
+        """
+        with self._lock:
+            self._rules.clear()
+            self._locations.clear()
+            self._versions.clear()
+
+    def _record(self, versions: dict):
+        """
+        Record versions of loaded locations changed by this process,
+         lock must be held. A version is recorded only if it follows
+         the loaded one, otherwise location was changed by another
+         process too and stays stale.
+        :param versions: new versions by location key.
+        :return: nothing
+        """
+        for key, version in versions.items():
+            if self._versions.get(key) == version - 1:
+                self._versions[key] = version
+
+    def _insert(self, rule: AlertRule):
+        """
+        Insert rule keeping numbers sorted, lock must be held.
+        :param rule: rule.
+        :return: nothing
+        """
+        numbers, rules = self._locations[rule.location_key].setdefault(
+            rule.column_name, {}
+        ).setdefault(rule.comparator, ([], []))
+        position = bisect.bisect_right(numbers, rule.number)
+        numbers.insert(position, rule.number)
+        rules.insert(position, rule)
+        self._rules[rule.id] = rule
+
+    def _remove(self, alert_id: int):
+        """
+        Remove rule by id, lock must be held.
+        :param alert_id: id of alert.
+        :return: nothing
+        """
+        rule = self._rules.pop(alert_id, None)
+        if rule is None:
+            return
+        numbers, rules = self._locations[rule.location_key][
+            rule.column_name][rule.comparator]
+        position = rules.index(rule, bisect.bisect_left(numbers, rule.number))
+        del numbers[position]
+        del rules[position]
+
+
+alert_index = AlertIndex()
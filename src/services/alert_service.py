@@ -1,106 +1,475 @@
-import queue
+import asyncio
 import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 from datetime import datetime, timezone
-from typing import Type
+from typing import Iterable, Optional
 
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 
-from core.database import get_db
-from models.models import WeatherAlertDB, NotificationDB
+from core.config import settings
+from core.database import SessionLocal
+from services.alert_index import alert_index
+from services.alert_state import alert_states
+from services.process_lock import ProcessLock
+from models.models import AlertOutboxDB, NotificationDB, WeatherCacheDB
 
 
-class AlertBackgroundService(threading.Thread):
+class AlertBackgroundService:
     """
-    Service for handling alerts.
+    Asyncio service for handling alerts. Stored snapshots are taken
+     from alert outbox of its partition when service is woken.
+     Db work runs in executor, so that it doesn't block the event loop.
     """
-    def __init__(self, input_queue=None):
+    WAKE = "wake"
+    STOP = "stop"
+
+    def __init__(self, session_factory=SessionLocal, partition: int = 0,
+                 executor: Optional[ThreadPoolExecutor] = None):
         """
         Initialization of service.
-        :param input_queue: queue that will be copied.
+        :param session_factory: factory of db sessions.
+        :param partition: partition of alert outbox.
+        :param executor: executor for db work, default one if None.
+        """
+        self.session_factory = session_factory
+        self.partition = partition
+        self.executor = executor
+        self.input_queue: Optional[asyncio.Queue] = None
+        self.processed = 0
+        self.batches = 0
+        self._recent = deque()
+        self._metrics_lock = threading.Lock()
+        self._loop = None
+        self._task = None
+
+    def start(self):
+        """
+        Start processing in the running event loop
+        :return:
+        """
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self.input_queue = asyncio.Queue()
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """
+        Process signals that are already queued and stop
+        :return:
         """
-        super().__init__()
-        self.daemon = True
-        self.input_queue = input_queue if input_queue else queue.Queue()
-        self._stop_event = threading.Event()
+        if self._task is None:
+            return
+        self.input_queue.put_nowait(self.STOP)
+        await self._task
+        self._task = None
+        self._loop = None
 
-    def stop(self):
+    def put(self, entry):
         """
-        Signal the thread to stop
+        Put entry to the queue from any thread. Entries are dropped
+         if service isn't started, stored snapshots stay in outbox
+        :param entry: entry
         :return:
         """
-        self._stop_event.set()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self.input_queue.put_nowait,
+                                            entry)
 
-    def add_item(self, item: dict):
+    def wake(self):
         """
-        Add an item to be processed by the background service
-        :param item: item
+        Signal that alert outbox has new rows
         :return:
         """
-        self.input_queue.put(item)
+        self.put(self.WAKE)
 
-    def run(self):
+    async def run(self):
         """
-        Main processing loop
+        Main processing loop, signals are taken in batches. Outbox
+         is processed only when service is woken, rows left
+         by a restart or written by another process are found by pool
         :return:
         """
-        while not self._stop_event.is_set():
+        while True:
+            batch = await self.drain()
             try:
-                item = self.input_queue.get(timeout=0.1)
-                AlertBackgroundService.process_item(item)
-                self.input_queue.task_done()
-            except queue.Empty:
-                continue
+                await self.process_outbox()
+            finally:
+                for _ in batch:
+                    self.input_queue.task_done()
+            if self.STOP in batch:
+                return
 
-    @staticmethod
-    def process_item(weather_data: dict):
+    async def offload(self, function, *args):
+        """
+        Run db work in executor
+        :param function: function
+        :param args: arguments
+        :return: result of function
         """
-        Process a single item from the queue
-        :param weather_data: weather data to process.
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, function, *args
+        )
+
+    async def process_outbox(self):
+        """
+        Process outbox of partition batch by batch until it is empty
         :return:
         """
-        try:
-            db: Session = next(get_db())
-            alerts = db.query(WeatherAlertDB).filter_by(
-                location=weather_data["location"]).all()
-            for alert in alerts:
-                if alert.column_name == "humidity":
-                    actual_number = weather_data["humidity"]
-                elif alert.column_name == "temperature":
-                    actual_number = weather_data["temperature"]
-                elif alert.column_name == "pressure":
-                    actual_number = weather_data["pressure"]
-                else:
-                    continue
-                if AlertBackgroundService.to_be_notified(alert, actual_number):
-                    db.add(NotificationDB(
-                        user_id=alert.user_id,
-                        location=alert.location,
-                        column_name=alert.column_name,
-                        comparator=alert.comparator,
-                        number=alert.number,
-                        timestamp=datetime.now(timezone.utc),
-                        actual_number=actual_number
-                    ))
+        while True:
+            claimed = await self.offload(self.process_outbox_batch)
+            if claimed:
+                self.record(claimed)
+            if claimed < settings.alert_batch_size:
+                return
 
+    def process_outbox_batch(self) -> int:
+        """
+        Claim the oldest batch of outbox rows of partition and evaluate
+         the latest snapshot of every location. Processed rows are
+         deleted in the transaction that adds notifications, so that
+         every row is evaluated at least once
+        :return: number of processed rows
+        """
+        db = self.session_factory()
+        latest = {}
+        try:
+            rows = db.query(AlertOutboxDB.id, WeatherCacheDB).outerjoin(
+                WeatherCacheDB, WeatherCacheDB.id == AlertOutboxDB.snapshot_id
+            ).filter(AlertOutboxDB.partition == self.partition).order_by(
+                AlertOutboxDB.id
+            ).limit(settings.alert_batch_size).all()
+            if not rows:
+                return 0
+            latest = {snapshot.location: snapshot.to_dict()
+                      for _, snapshot in rows if snapshot is not None}
+            AlertBackgroundService.add_notifications(db, latest.values())
+            db.query(AlertOutboxDB).filter(
+                AlertOutboxDB.partition == self.partition,
+                AlertOutboxDB.id <= rows[-1][0]
+            ).delete(synchronize_session=False)
             db.commit()
+            return len(rows)
         except Exception as e:
+            db.rollback()
+            AlertBackgroundService.invalidate(latest)
             print(e)
+            return 0
+        finally:
+            db.close()
+
+    def record(self, count: int):
+        """
+        Record processed batch for metrics
+        :param count: number of processed outbox rows.
+        :return:
+        """
+        now = time.monotonic()
+        with self._metrics_lock:
+            self.processed += count
+            self.batches += 1
+            self._recent.append((now, count))
+            self._forget_old(now)
+
+    def metrics(self) -> dict:
+        """
+        Get queue and outbox depth and processing rate of the service
+        :return: metrics
+        """
+        db = self.session_factory()
+        try:
+            outbox_depth = db.query(AlertOutboxDB).filter_by(
+                partition=self.partition
+            ).count()
+        finally:
+            db.close()
+        with self._metrics_lock:
+            self._forget_old(time.monotonic())
+            recent = sum(count for _, count in self._recent)
+            return {
+                "queue_depth": (self.input_queue.qsize()
+                                if self.input_queue is not None else 0),
+                "outbox_depth": outbox_depth,
+                "processed": self.processed,
+                "batches": self.batches,
+                "rate": recent / settings.alert_rate_window_seconds,
+            }
+
+    def _forget_old(self, now: float):
+        """
+        Forget batches that are older than rate window, lock must be held
+        :param now: current monotonic time.
+        :return:
+        """
+        window_start = now - settings.alert_rate_window_seconds
+        while self._recent and self._recent[0][0] < window_start:
+            self._recent.popleft()
+
+    async def drain(self) -> list:
+        """
+        Wait for an entry and take entries that follow it, until alert
+         batch size is reached or alert batch wait time passes
+        :return: entries taken from the queue
+        """
+        batch = [await self.input_queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.alert_batch_wait_ms / 1000
+        while len(batch) < settings.alert_batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.input_queue.get(),
+                                                    remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
 
     @staticmethod
-    def to_be_notified(alert: Type[WeatherAlertDB], actual_number: float):
-        """
-        Checker for comparing alert and weather data
-        :param alert: alert.
-        :param actual_number: value of column
-        :return: True if it is correct, else False
-        """
-        if alert.comparator == "<":
-            return actual_number < alert.number
-        elif alert.comparator == "<=":
-            return actual_number <= alert.number
-        elif alert.comparator == ">":
-            return actual_number > alert.number
-        elif alert.comparator == ">=":
-            return actual_number >= alert.number
-        return False
+    def add_notifications(db: Session, snapshots: Iterable[dict]):
+        """
+        Add notifications for alerts whose condition started to hold
+         or holds longer than cooldown, with one insert. Alerts and
+         their states are loaded with one query for all locations,
+         if they aren't in memory yet or were changed by another
+         process. Changes are not committed
+        :param db: db session.
+        :param snapshots: weather data to check.
+        :return:
+        """
+        snapshots = list(snapshots)
+        keys = {weather_data["location"] for weather_data in snapshots}
+        for key in alert_index.stale(db, keys):
+            alert_index.invalidate(key)
+            alert_states.invalidate(key)
+        alert_index.load_many(db, keys)
+        alert_states.load_many(db, keys)
+        notifications, changes = [], {}
+        for weather_data in snapshots:
+            now = (WeatherCacheDB.to_datetime(weather_data.get("timestamp"))
+                   or datetime.now(timezone.utc).replace(tzinfo=None))
+            triggered = alert_index.match(db, weather_data)
+            notify, changed = alert_states.evaluate(weather_data, now,
+                                                    triggered)
+            changes.update(changed)
+            notifications += [
+                {
+                    "user_id": alert.user_id,
+                    "location": alert.location,
+                    "column_name": alert.column_name,
+                    "comparator": alert.comparator,
+                    "number": alert.number,
+                    "timestamp": now,
+                    "actual_number": actual_number,
+                }
+                for alert, actual_number in notify
+            ]
+        if notifications:
+            db.execute(insert(NotificationDB.__table__), notifications)
+        alert_states.save(db, changes)
+
+    @staticmethod
+    def invalidate(keys: Iterable[str]):
+        """
+        Forget states of locations whose transaction failed,
+         so that they are loaded again from db
+        :param keys: location keys.
+        :return:
+        """
+        for key in keys:
+            alert_states.invalidate(key)
+
+
+class AlertWorkerPool:
+    """
+    Pool of alert services. Weather data is partitioned by hash
+     of location, so that data of one location is always processed
+     in order by the same service, while locations of different
+     partitions are processed in parallel. When app runs in several
+     processes, only the process holding engine lock runs services,
+     outbox rows written by the others are found by one poll
+     of the pool every alert outbox poll seconds.
+    """
+    def __init__(self, workers: int = 1, session_factory=SessionLocal,
+                 lock: Optional[ProcessLock] = None):
+        """
+        Initialization of pool. Services are started by start.
+        :param workers: number of services.
+        :param session_factory: factory of db sessions.
+        :param lock: lock electing the process that runs services,
+         services always run if None.
+        """
+        self.session_factory = session_factory
+        self.lock = lock
+        self.executor = None
+        self._election = None
+        self._poll = None
+        self.workers = [
+            AlertBackgroundService(session_factory=session_factory,
+                                   partition=partition)
+            for partition in range(max(workers, 1))
+        ]
+
+    async def start(self):
+        """
+        Start services once this process holds engine lock. Until then
+         lock is tried again every alert outbox poll seconds, so that
+         another process takes over when the one running services exits
+        :return:
+        """
+        if self.executor is not None or self._election is not None:
+            return
+        if self.lock is None or self.lock.acquire():
+            await self.start_workers()
+        else:
+            self._election = asyncio.create_task(self.wait_for_lock())
+
+    async def wait_for_lock(self):
+        """
+        Wait until engine lock is taken and start services
+        :return:
+        """
+        while not self.lock.acquire():
+            await asyncio.sleep(settings.alert_outbox_poll_seconds)
+        await self.start_workers()
+
+    async def start_workers(self):
+        """
+        Start services in the running event loop, with db work
+         in executor of alert executor workers threads, and wake
+         services of partitions that have rows left in outbox. Outbox
+         is polled only if app is served by several processes
+        :return:
+        """
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.alert_executor_workers,
+            thread_name_prefix="alerts"
+        )
+        pending = await asyncio.get_running_loop().run_in_executor(
+            self.executor, self.repartition
+        )
+        for worker in self.workers:
+            worker.executor = self.executor
+            worker.start()
+        for partition in pending:
+            self.workers[partition].wake()
+        if settings.web_concurrency > 1:
+            self._poll = asyncio.create_task(self.poll())
+
+    async def poll(self):
+        """
+        Wake services of partitions that have rows in outbox every
+         alert outbox poll seconds, so that rows written by processes
+         that don't run services are evaluated
+        :return:
+        """
+        while True:
+            await asyncio.sleep(settings.alert_outbox_poll_seconds)
+            try:
+                pending = await asyncio.get_running_loop().run_in_executor(
+                    self.executor, self.pending_partitions
+                )
+            except Exception as e:
+                print(f"Error polling alert outbox: {e}")
+                continue
+            for partition in pending:
+                self.workers[partition].wake()
+
+    def pending_partitions(self) -> set[int]:
+        """
+        Get partitions that have rows in outbox
+        :return: indexes of services
+        """
+        db = self.session_factory()
+        try:
+            return {partition for partition, in
+                    db.query(AlertOutboxDB.partition).distinct()}
+        finally:
+            db.close()
+
+    async def stop(self):
+        """
+        Stop services after they process queued signals
+         and wait for db work to finish
+        :return:
+        """
+        for task in (self._election, self._poll):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._election = self._poll = None
+        await asyncio.gather(*[worker.stop() for worker in self.workers])
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        if self.lock is not None:
+            self.lock.release()
+
+    def partition_of(self, location: str) -> int:
+        """
+        Get partition of location, stable across restarts
+        :param location: location key.
+        :return: index of service
+        """
+        return zlib.crc32(location.encode()) % len(self.workers)
+
+    def repartition(self) -> set[int]:
+        """
+        Move outbox rows left with another number of services
+         to partitions of their locations
+        :return: partitions that have rows in outbox, all if outbox
+         couldn't be read
+        """
+        db = self.session_factory()
+        try:
+            pending = db.query(AlertOutboxDB.location,
+                               AlertOutboxDB.partition).distinct().all()
+            for location, partition in pending:
+                if partition != self.partition_of(location):
+                    db.query(AlertOutboxDB).filter_by(
+                        location=location
+                    ).update({"partition": self.partition_of(location)})
+            db.commit()
+            return {self.partition_of(location) for location, _ in pending}
+        except Exception as e:
+            print(f"Error repartitioning alert outbox: {e}")
+            return set(range(len(self.workers)))
+        finally:
+            db.close()
+
+    def enqueue(self, db: Session, rows: list[WeatherCacheDB]):
+        """
+        Add stored snapshots to alert outbox. Changes are not committed
+        :param db: db session.
+        :param rows: stored snapshots with ids.
+        :return:
+        """
+        db.add_all([
+            AlertOutboxDB(snapshot_id=row.id, location=row.location,
+                          partition=self.partition_of(row.location))
+            for row in rows
+        ])
+
+    def wake(self, locations: Iterable[str]):
+        """
+        Wake services of partitions of locations
+        :param locations: location keys.
+        :return:
+        """
+        for partition in {self.partition_of(key) for key in locations}:
+            self.workers[partition].wake()
+
+    def metrics(self) -> list[dict]:
+        """
+        Get metrics of every partition
+        :return: metrics
+        """
+        return [{"partition": partition, **worker.metrics()}
+                for partition, worker in enumerate(self.workers)]
@@ -0,0 +1,179 @@
+import threading
+from datetime import datetime, timedelta
+from typing import Iterable
+
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from models.models import AlertStateDB, WeatherAlertDB
+from services.alert_index import AlertIndex, AlertRule, alert_index
+
+
+class AlertStates:
+    """
+    States of alerts, used to notify only when condition of alert
+     starts to hold, or again once cooldown has passed. Active alert
+     is released when value is back past its number by hysteresis,
+     so that values around the number don't cause new notifications.
+    States are kept in memory and changes are returned by evaluate,
+     so that they are saved in the transaction of the notifications
+     they belong to. Locations whose transaction failed are
+     invalidated and loaded again from db.
+    """
+    def __init__(self):
+        """
+        Initialization of states.
+        """
+        self._states = {}
+        self._alerts = {}
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def load_many(self, db: Session, keys: Iterable[str]):
+        """
+        Load states of alerts of locations that aren't loaded yet
+         with one query.
+        :param db: db session.
+        :param keys: location keys.
+        :return: nothing
+        """
+        with self._lock:
+            missing = [key for key in keys if key not in self._active]
+            if not missing:
+                return
+            rows = db.query(AlertStateDB, WeatherAlertDB.location_key).join(
+                WeatherAlertDB, WeatherAlertDB.id == AlertStateDB.alert_id
+            ).filter(WeatherAlertDB.location_key.in_(missing)).all()
+            for key in missing:
+                self._active[key] = set()
+                self._alerts[key] = set()
+            for state, key in rows:
+                self._states[state.alert_id] = {
+                    "active": bool(state.active),
+                    "last_notified": state.last_notified,
+                }
+                self._alerts[key].add(state.alert_id)
+                if state.active:
+                    self._active[key].add(state.alert_id)
+
+    def evaluate(self, weather_data: dict, now: datetime,
+                 triggered: list[tuple]) -> tuple[list[tuple], dict]:
+        """
+        Update states of alerts of location with weather data.
+        :param weather_data: weather data.
+        :param now: time of weather data, naive UTC.
+        :param triggered: rules whose condition holds and actual values.
+        :return: rules that have to notify and actual values,
+         and changed states by id of alert, to be saved.
+        """
+        key = weather_data["location"]
+        notify, changes = [], {}
+        with self._lock:
+            active = self._active.setdefault(key, set())
+            alerts = self._alerts.setdefault(key, set())
+            for rule, actual in triggered:
+                state = self._states.setdefault(
+                    rule.id, {"active": False, "last_notified": None}
+                )
+                alerts.add(rule.id)
+                if state["active"] and not self.cooled_down(state, now):
+                    continue
+                state["active"], state["last_notified"] = True, now
+                active.add(rule.id)
+                changes[rule.id] = dict(state)
+                notify.append((rule, actual))
+
+            ids = {rule.id for rule, _actual in triggered}
+            for alert_id in list(active - ids):
+                if self.released(alert_index.rule(alert_id), weather_data):
+                    self._states[alert_id]["active"] = False
+                    active.discard(alert_id)
+                    changes[alert_id] = dict(self._states[alert_id])
+        return notify, changes
+
+    @staticmethod
+    def cooled_down(state: dict, now: datetime) -> bool:
+        """
+        Check if active alert can notify again.
+        :param state: state of alert.
+        :param now: current time.
+        :return: True if cooldown is set and has passed, else False
+        """
+        cooldown = settings.alert_cooldown_seconds
+        return (cooldown > 0 and (
+            state["last_notified"] is None
+            or now - state["last_notified"] >= timedelta(seconds=cooldown)
+        ))
+
+    @staticmethod
+    def released(rule: AlertRule, weather_data: dict) -> bool:
+        """
+        Check if value is back past number of alert by hysteresis.
+        :param rule: rule of alert, None if alert was deleted.
+        :param weather_data: weather data.
+        :return: True if alert has to be released, else False
+        """
+        if rule is None:
+            return True
+        actual = weather_data.get(rule.column_name)
+        if actual is None:
+            return False
+        band = settings.alert_hysteresis
+        number = (rule.number - band if rule.comparator in (">", ">=")
+                  else rule.number + band)
+        return not AlertIndex.holds(rule.comparator, actual, number)
+
+    @staticmethod
+    def save(db: Session, changes: dict):
+        """
+        Save changed states with one upsert. Changes are not committed.
+        :param db: db session.
+        :param changes: changed states by id of alert.
+        :return: nothing
+        """
+        states = [{"alert_id": alert_id, **state}
+                  for alert_id, state in changes.items()]
+        if not states:
+            return
+        statement = insert(AlertStateDB)
+        db.execute(statement.on_conflict_do_update(
+            index_elements=["alert_id"],
+            set_={"active": statement.excluded.active,
+                  "last_notified": statement.excluded.last_notified}
+        ), states)
+
+    def reset(self, alert_id: int):
+        """
+        Forget state of updated or deleted alert.
+        :param alert_id: id of alert.
+        :return: nothing
+        """
+        with self._lock:
+            self._states.pop(alert_id, None)
+            for ids in (*self._active.values(), *self._alerts.values()):
+                ids.discard(alert_id)
+
+    def invalidate(self, key: str):
+        """
+        Forget states of location, they are loaded again when needed.
+        :param key: location key.
+        :return: nothing
+        """
+        with self._lock:
+            self._active.pop(key, None)
+            for alert_id in self._alerts.pop(key, ()):
+                self._states.pop(alert_id, None)
+
+    def clear(self):
+        """
+        Forget all states.
+        :return: nothing
+        """
+        with self._lock:
+            self._states.clear()
+            self._alerts.clear()
+            self._active.clear()
+
+
+alert_states = AlertStates()
@@ -0,0 +1,324 @@
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Iterator, Optional
+from urllib.parse import quote
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from core.config import settings
+from core.database import SessionLocal, incremental_vacuum
+from models.models import WeatherCacheDB
+
+
+class ArchiveService:
+    """
+    Service for moving old weather history from db to compressed
+     Parquet files, one directory per location and month,
+     and for reading it back. Archived snapshots are deleted
+     by retention like stored ones.
+    """
+    schema = pa.schema(
+        [("id", pa.int64()), ("location", pa.string()),
+         ("timestamp", pa.timestamp("us"))]
+        + [(field, pa.string()) for field in
+           ("main_weather", "icon", "description")]
+        + [(field, pa.float64()) for field in WeatherCacheDB.fields
+           if field not in ("main_weather", "icon", "description",
+                            "sunrise", "sunset")]
+        + [("sunrise", pa.timestamp("us")), ("sunset", pa.timestamp("us"))]
+    )
+
+    def __init__(self, path: Optional[Path] = None,
+                 session_factory=SessionLocal):
+        """
+        Initialization of service.
+        :param path: directory of archive.
+        :param session_factory: factory of db sessions.
+        """
+        self.path = path or settings.database_path / "archive"
+        self.session_factory = session_factory
+        self._task = None
+
+    def start(self):
+        """
+        Start archiving in background.
+        :return: nothing
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """
+        Stop archiving and wait for background task to finish.
+        :return: nothing
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self):
+        """
+        Main archiving loop. Archiving runs in a thread,
+         so that it doesn't block the event loop.
+        :return: nothing
+        """
+        while True:
+            try:
+                await asyncio.to_thread(self.archive)
+            except Exception as e:
+                print(f"Archiving failed: {e}")
+            await asyncio.sleep(settings.archive_interval_seconds)
+
+    def archive(self) -> int:
+        """
+        Move snapshots older than archive after days to archive in batches.
+        Files of a batch are written before its rows are deleted
+         and removed again if deleting fails.
+        :return: number of archived snapshots.
+        """
+        cutoff = (datetime.now(timezone.utc).replace(tzinfo=None)
+                  - timedelta(days=settings.archive_after_days))
+        archived = 0
+        db = self.session_factory()
+        try:
+            while True:
+                rows = db.query(WeatherCacheDB).filter(
+                    WeatherCacheDB.timestamp < cutoff
+                ).order_by(WeatherCacheDB.id).limit(
+                    settings.archive_batch_size
+                ).all()
+                if not rows:
+                    break
+                files = self.write(rows)
+                try:
+                    db.query(WeatherCacheDB).filter(WeatherCacheDB.id.in_(
+                        [row.id for row in rows]
+                    )).delete(synchronize_session=False)
+                    db.commit()
+                except Exception:
+                    db.rollback()
+                    for file in files:
+                        file.unlink(missing_ok=True)
+                    raise
+                db.expunge_all()
+                archived += len(rows)
+            incremental_vacuum(db)
+        finally:
+            db.close()
+        return archived
+
+    def write(self, rows: list[WeatherCacheDB]) -> list[Path]:
+        """
+        Write snapshots to one new file per location and month.
+        :param rows: snapshots.
+        :return: paths of written files.
+        """
+        partitions = {}
+        for row in rows:
+            record = {field: getattr(row, field)
+                      for field in self.schema.names}
+            partitions.setdefault(
+                (row.location, row.timestamp.strftime("%Y-%m")), []
+            ).append(record)
+
+        files = []
+        for (location, month), records in partitions.items():
+            directory = self.location_path(location) / month
+            directory.mkdir(parents=True, exist_ok=True)
+            ids = [record["id"] for record in records]
+            file = directory / f"part-{min(ids)}-{max(ids)}.parquet"
+            temporary = file.with_suffix(".tmp")
+            pq.write_table(pa.Table.from_pylist(records, self.schema),
+                           temporary, compression="zstd")
+            os.replace(temporary, file)
+            files.append(file)
+        return files
+
+    def purge(self, cutoff: datetime) -> int:
+        """
+        Delete archived snapshots older than cutoff. Files of months
+         that ended before cutoff are removed, files of the month
+         of cutoff are written again without older rows.
+        :param cutoff: naive UTC.
+        :return: number of deleted snapshots.
+        """
+        if not self.path.is_dir():
+            return 0
+        deleted = 0
+        for month_path in sorted(self.path.glob("*/*")):
+            month = datetime.strptime(month_path.name, "%Y-%m")
+            if month >= cutoff:
+                continue
+            for file in sorted(month_path.glob("*.parquet")):
+                deleted += self.purge_file(file, cutoff)
+            if not any(month_path.iterdir()):
+                month_path.rmdir()
+        return deleted
+
+    def purge_file(self, file: Path, cutoff: datetime) -> int:
+        """
+        Delete snapshots older than cutoff from archive file.
+        :param file: path of file.
+        :param cutoff: naive UTC.
+        :return: number of deleted snapshots.
+        """
+        table = pq.read_table(file)
+        kept = table.filter(pc.field("timestamp") >= cutoff)
+        if kept.num_rows == table.num_rows:
+            return 0
+        if kept.num_rows:
+            temporary = file.with_suffix(".tmp")
+            pq.write_table(kept, temporary, compression="zstd")
+            os.replace(temporary, file)
+        else:
+            file.unlink()
+        return table.num_rows - kept.num_rows
+
+    def move(self, source: str, key: str) -> int:
+        """
+        Move archived snapshots of one location to another. Files are
+         written again with the new location, so that months of both
+         locations are merged, and removed from the old directory.
+        :param source: location key snapshots are archived under.
+        :param key: location key to move snapshots to.
+        :return: number of moved files.
+        """
+        source_path = self.location_path(source)
+        if source == key or not source_path.is_dir():
+            return 0
+        moved = 0
+        for month_path in sorted(source_path.iterdir()):
+            directory = self.location_path(key) / month_path.name
+            directory.mkdir(parents=True, exist_ok=True)
+            for file in sorted(month_path.glob("*.parquet")):
+                table = pq.read_table(file)
+                table = table.set_column(
+                    table.schema.get_field_index("location"), "location",
+                    pa.array([key] * table.num_rows, pa.string())
+                )
+                temporary = (directory / file.name).with_suffix(".tmp")
+                pq.write_table(table, temporary, compression="zstd")
+                os.replace(temporary, directory / file.name)
+                file.unlink()
+                moved += 1
+            if not any(month_path.iterdir()):
+                month_path.rmdir()
+        if not any(source_path.iterdir()):
+            source_path.rmdir()
+        return moved
+
+    def location_path(self, key: str) -> Path:
+        """
+        Get directory of location in archive.
+        :param key: canonical location key.
+        :return: path.
+        """
+        return self.path / quote(key, safe="")
+
+    def read(self, key: str, start: Optional[datetime] = None,
+             end: Optional[datetime] = None,
+             columns: Optional[list[str]] = None) -> Iterator[pa.Table]:
+        """
+        Read archived snapshots of location in time range month by month.
+        Files are memory mapped and only requested columns are read.
+        :param key: canonical location key.
+        :param start: include rows at or after start, naive UTC.
+        :param end: include rows before end, naive UTC.
+        :param columns: columns, all if None.
+        :return: iterator over tables of months ordered by time.
+        """
+        location_path = self.location_path(key)
+        if not location_path.is_dir():
+            return
+        if columns is not None and "timestamp" not in columns:
+            columns = columns + ["timestamp"]
+        for month_path in sorted(location_path.iterdir()):
+            month = datetime.strptime(month_path.name, "%Y-%m")
+            next_month = (month + timedelta(days=32)).replace(day=1)
+            if end is not None and month >= end:
+                break
+            if start is not None and next_month <= start:
+                continue
+            files = sorted(month_path.glob("*.parquet"))
+            if not files:
+                continue
+            table = pa.concat_tables([
+                pq.read_table(file, columns=columns, memory_map=True)
+                for file in files
+            ])
+            if start is not None:
+                table = table.filter(pc.field("timestamp") >= start)
+            if end is not None:
+                table = table.filter(pc.field("timestamp") < end)
+            yield table
+
+    def iter_rows(self, key: str, start: Optional[datetime] = None,
+                  end: Optional[datetime] = None,
+                  after: Optional[tuple[datetime, int]] = None
+                  ) -> Iterator[WeatherCacheDB]:
+        """
+        Iterate over archived snapshots ordered by time and id.
+        Snapshots are returned as rows that aren't added to db session.
+        :param key: canonical location key.
+        :param start: include rows at or after start, naive UTC.
+        :param end: include rows before end, naive UTC.
+        :param after: timestamp and id, include only rows after them.
+        :return: iterator over snapshots.
+        """
+        if after is not None:
+            start = max(start, after[0]) if start is not None else after[0]
+        for table in self.read(key, start, end):
+            table = table.sort_by([("timestamp", "ascending"),
+                                   ("id", "ascending")])
+            for record in table.to_pylist():
+                if after is not None and (record["timestamp"],
+                                          record["id"]) <= after:
+                    continue
+                yield self.to_row(record)
+
+    def load(self, key: str, fields: list[str],
+             start: Optional[datetime] = None,
+             end: Optional[datetime] = None) -> np.ndarray:
+        """
+        Load fields of archived snapshots in time range into matrix.
+        :param key: canonical location key.
+        :param fields: fields.
+        :param start: include rows at or after start, naive UTC.
+        :param end: include rows before end, naive UTC.
+        :return: matrix with a row per snapshot and a column per field,
+         missing values are NaN.
+        """
+        matrices = [
+            np.column_stack([
+                table.column(field).to_numpy(zero_copy_only=False)
+                .astype(np.float64) for field in fields
+            ])
+            for table in self.read(key, start, end, list(fields))
+        ]
+        if not matrices:
+            return np.empty((0, len(fields)))
+        return np.vstack(matrices)
+
+    @staticmethod
+    def to_row(record: dict) -> WeatherCacheDB:
+        """
+        Convert archived record to snapshot row.
+        :param record: archived record.
+        :return: row that isn't added to db session.
+        """
+        row = WeatherCacheDB(location=record["location"], data=record,
+                             timestamp=record["timestamp"])
+        row.id = record["id"]
+        return row
+
+
+archive_service = ArchiveService()
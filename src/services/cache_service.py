@@ -0,0 +1,144 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Bounded in-memory cache with per-entry expiry and LRU eviction.
+    """
+    def __init__(self, max_size: int, ttl: float):
+        """
+        Initialization of cache.
+        :param max_size: maximum number of entries kept in memory.
+        :param ttl: default time to live of an entry in seconds.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Get value from cache and mark it as recently used.
+        :param key: key.
+        :return: value or None if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """
+        Put value to cache, evicting least recently used entries if full.
+        :param key: key.
+        :param value: value.
+        :param ttl: time to live in seconds, default ttl if not given.
+        :return: nothing
+        """
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0 or self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable):
+        """
+        Remove value from cache.
+        :param key: key.
+        :return: nothing
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """
+        Remove all values and reset counters.
+        :return: nothing
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self) -> dict:
+        """
+        Get cache counters.
+        :return: size, hits, misses and evictions of cache.
+        """
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SingleFlight:
+    """
+    Coalescing of concurrent calls, so that only one call per key
+     is in flight and every other caller awaits its result.
+    """
+    def __init__(self):
+        """
+        Initialization of coalescer.
+        """
+        self._calls = {}
+
+    async def do(self, key: Hashable,
+                 function: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Call function unless a call with the same key is in flight,
+         in which case wait for that call instead.
+        :param key: key.
+        :param function: coroutine function without arguments.
+        :return: result of function.
+        """
+        future = self._calls.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await function()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark exception as retrieved when nobody else is waiting.
+            future.exception()
+            raise
+        finally:
+            del self._calls[key]
+        future.set_result(result)
+        return result
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._calls
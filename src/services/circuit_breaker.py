@@ -0,0 +1,60 @@
+import time
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker that stops calls after consecutive failures
+     and lets one probe call through once reset timeout has passed.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        """
+        Initialization of circuit breaker.
+        :param failure_threshold: number of consecutive failures
+         after which circuit is opened.
+        :param reset_timeout: seconds after which open circuit
+         lets a probe call through.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def allow(self) -> bool:
+        """
+        Check if call can be made. Once reset timeout has passed,
+         circuit becomes half-open and lets one probe call through,
+         another one only if the probe hasn't finished in reset timeout.
+        :return: True if call can be made, else False
+        """
+        if self.state == self.CLOSED:
+            return True
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self.opened_at = time.monotonic()
+            return True
+        return False
+
+    def record_success(self):
+        """
+        Record successful call, closing the circuit.
+        :return: nothing
+        """
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self):
+        """
+        Record failed call, opening the circuit if probe failed
+         or there were too many consecutive failures.
+        :return: nothing
+        """
+        self.failures += 1
+        if (self.state == self.HALF_OPEN
+                or self.failures >= self.failure_threshold):
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
@@ -0,0 +1,68 @@
+import asyncio
+
+from core.config import settings
+from services.process_lock import ProcessLock
+
+
+class ElectedServices:
+    """
+    Background services that run in one process only, when app is
+     served by several worker processes. The process holding the lock
+     runs services, the others try to take the lock every election
+     retry seconds, so that one of them takes over when it exits.
+    """
+    def __init__(self, lock: ProcessLock, services: list):
+        """
+        Initialization of elected services.
+        :param lock: lock electing the process that runs services.
+        :param services: services with start and async stop.
+        """
+        self.lock = lock
+        self.services = services
+        self._election = None
+
+    def start(self):
+        """
+        Start services if this process holds the lock, else wait
+         for the lock in background.
+        :return: nothing
+        """
+        if self.lock.held or self._election is not None:
+            return
+        if self.lock.acquire():
+            self.start_services()
+        else:
+            self._election = asyncio.create_task(self.wait_for_lock())
+
+    async def wait_for_lock(self):
+        """
+        Wait until the lock is taken and start services.
+        :return: nothing
+        """
+        while not self.lock.acquire():
+            await asyncio.sleep(settings.election_retry_seconds)
+        self.start_services()
+
+    def start_services(self):
+        """
+        Start every service.
+        :return: nothing
+        """
+        for service in self.services:
+            service.start()
+
+    async def stop(self):
+        """
+        Stop waiting for the lock, stop services and release the lock.
+        :return: nothing
+        """
+        if self._election is not None:
+            self._election.cancel()
+            try:
+                await self._election
+            except asyncio.CancelledError:
+                pass
+            self._election = None
+        for service in reversed(self.services):
+            await service.stop()
+        self.lock.release()
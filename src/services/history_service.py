@@ -0,0 +1,299 @@
+import base64
+import binascii
+import csv
+import heapq
+import io
+import json
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Iterable, Iterator, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import and_, func, or_
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from models.models import WeatherCacheDB, WeatherRollupDB
+from services.archive_service import archive_service
+
+
+class HistoryService:
+    """
+    Service for reading weather history and maintaining its rollups.
+    """
+    resolutions = ("hour", "day")
+    export_fields = ("location", "timestamp") + WeatherCacheDB.fields
+
+    @staticmethod
+    def to_utc(value: Optional[datetime]) -> Optional[datetime]:
+        """
+        Convert datetime to naive UTC, in which timestamps are stored.
+        :param value: datetime, naive values are treated as UTC.
+        :return: naive UTC datetime.
+        """
+        if value is None or value.tzinfo is None:
+            return value
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+    @staticmethod
+    def encode_cursor(timestamp: datetime, row_id: int) -> str:
+        """
+        Make opaque cursor pointing after row.
+        :param timestamp: timestamp of the last row of page.
+        :param row_id: id of the last row of page.
+        :return: cursor.
+        """
+        position = json.dumps([timestamp.isoformat(), row_id])
+        return base64.urlsafe_b64encode(position.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> tuple[datetime, int]:
+        """
+        Get position from opaque cursor.
+        :param cursor: cursor.
+        :return: timestamp and id of the last row of previous page.
+        """
+        try:
+            timestamp, row_id = json.loads(base64.urlsafe_b64decode(cursor))
+            return datetime.fromisoformat(timestamp), int(row_id)
+        except (binascii.Error, ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    @staticmethod
+    def get_page(db: Session, key: str, start: Optional[datetime] = None,
+                 end: Optional[datetime] = None, limit: int = 100,
+                 cursor: Optional[str] = None, resolution: str = "raw"):
+        """
+        Get page of history or its rollups ordered by time. Pages are read
+         with keyset pagination over (location, time) index,
+         so cost of a page doesn't depend on size of history.
+        Raw snapshots are merged with archived ones.
+        :param db: db session.
+        :param key: canonical location key.
+        :param start: include rows at or after start.
+        :param end: include rows before end.
+        :param limit: maximum number of rows.
+        :param cursor: cursor returned with previous page.
+        :param resolution: "raw" for snapshots, "hour" or "day" for rollups.
+        :return: rows and cursor of the next page, None if it is the last.
+        """
+        if resolution == "raw":
+            query = db.query(WeatherCacheDB).filter_by(location=key)
+            time_column = WeatherCacheDB.timestamp
+        else:
+            query = db.query(WeatherRollupDB).filter_by(
+                location=key, resolution=resolution
+            )
+            time_column = WeatherRollupDB.bucket
+        id_column = time_column.class_.id
+
+        start, end = HistoryService.to_utc(start), HistoryService.to_utc(end)
+        if start is not None:
+            query = query.filter(time_column >= start)
+        if end is not None:
+            query = query.filter(time_column < end)
+        position = None
+        if cursor is not None:
+            position = HistoryService.decode_cursor(cursor)
+            query = query.filter(or_(
+                time_column > position[0],
+                and_(time_column == position[0], id_column > position[1])
+            ))
+
+        rows = query.order_by(time_column, id_column).limit(limit + 1).all()
+        if resolution == "raw":
+            archived = archive_service.iter_rows(key, start, end, position)
+            rows = list(islice(HistoryService.merge(archived, rows),
+                               limit + 1))
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        last = rows[-1]
+        return rows, HistoryService.encode_cursor(
+            getattr(last, time_column.key), last.id
+        )
+
+    @staticmethod
+    def iter_rows(db: Session, key: str, start: Optional[datetime] = None,
+                  end: Optional[datetime] = None,
+                  batch_size: int = 1000) -> Iterator[dict]:
+        """
+        Iterate over history ordered by time, merging archived snapshots
+         with ones read from db in batches, so that memory doesn't grow
+         with size of history.
+        :param db: db session.
+        :param key: canonical location key.
+        :param start: include rows at or after start.
+        :param end: include rows before end.
+        :param batch_size: number of rows read at once.
+        :return: iterator over weather data.
+        """
+        query = db.query(WeatherCacheDB).filter_by(location=key)
+        start, end = HistoryService.to_utc(start), HistoryService.to_utc(end)
+        if start is not None:
+            query = query.filter(WeatherCacheDB.timestamp >= start)
+        if end is not None:
+            query = query.filter(WeatherCacheDB.timestamp < end)
+        query = query.order_by(WeatherCacheDB.timestamp, WeatherCacheDB.id)
+        archived = archive_service.iter_rows(key, start, end)
+        for row in HistoryService.merge(archived,
+                                        query.yield_per(batch_size)):
+            yield row.to_dict()
+
+    @staticmethod
+    def merge(*sources: Iterable[WeatherCacheDB]) -> Iterator[WeatherCacheDB]:
+        """
+        Merge snapshots of sources ordered by time and id.
+        :param sources: ordered snapshots.
+        :return: iterator over ordered snapshots.
+        """
+        return heapq.merge(*sources, key=lambda row: (row.timestamp, row.id))
+
+    @staticmethod
+    def export(snapshots: Iterable[dict], export_format: str,
+               batch_size: int = 1000) -> Iterator[str]:
+        """
+        Serialize snapshots to NDJSON or CSV, yielding one chunk
+         per batch of snapshots.
+        :param snapshots: weather data.
+        :param export_format: "ndjson" or "csv".
+        :param batch_size: number of snapshots in chunk.
+        :return: iterator over chunks of text.
+        """
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, HistoryService.export_fields,
+                                extrasaction="ignore")
+        if export_format == "csv":
+            writer.writeheader()
+        count = 0
+        for weather_data in snapshots:
+            weather_data = {
+                field: value.isoformat() if isinstance(value, datetime)
+                else value for field, value in weather_data.items()
+            }
+            if export_format == "csv":
+                writer.writerow(weather_data)
+            else:
+                buffer.write(json.dumps(weather_data) + "\n")
+            count += 1
+            if count % batch_size == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    @staticmethod
+    def bucket_of(timestamp: datetime, resolution: str) -> datetime:
+        """
+        Get start of hour or day that timestamp belongs to.
+        :param timestamp: timestamp.
+        :param resolution: "hour" or "day".
+        :return: naive UTC start of bucket.
+        """
+        bucket = HistoryService.to_utc(timestamp).replace(
+            minute=0, second=0, microsecond=0
+        )
+        return bucket.replace(hour=0) if resolution == "day" else bucket
+
+    @staticmethod
+    def add_to_rollups(db: Session, snapshots: list[dict]):
+        """
+        Add snapshots to hourly and daily rollups of their locations.
+        Snapshots are aggregated by bucket first and then upserted
+         with one statement. Changes are not committed.
+        :param db: db session.
+        :param snapshots: weather data.
+        :return: nothing
+        """
+        rollups = {}
+        for weather_data in snapshots:
+            for resolution in HistoryService.resolutions:
+                bucket = HistoryService.bucket_of(weather_data["timestamp"],
+                                                  resolution)
+                key = (weather_data["location"].lower(), resolution, bucket)
+                rollup = rollups.setdefault(key, {
+                    "location": key[0], "resolution": resolution,
+                    "bucket": bucket, "count": 0,
+                })
+                rollup["count"] += 1
+                for field in WeatherRollupDB.fields:
+                    HistoryService.aggregate(rollup, field,
+                                             float(weather_data[field]))
+        HistoryService.upsert_rollups(db, list(rollups.values()))
+
+    @staticmethod
+    def upsert_rollups(db: Session, rollups: list[dict]):
+        """
+        Insert rollups or merge them into existing rollups of the same
+         location, resolution and bucket, adding counts and sums
+         and taking min and max. Changes are not committed.
+        :param db: db session.
+        :param rollups: rows of rollups table.
+        :return: nothing
+        """
+        if not rollups:
+            return
+
+        statement = insert(WeatherRollupDB)
+        columns, excluded = WeatherRollupDB.__table__.c, statement.excluded
+        update = {"count": columns["count"] + excluded["count"]}
+        for field in WeatherRollupDB.fields:
+            for name, merge in (("min", func.min), ("max", func.max)):
+                column = f"{field}_{name}"
+                update[column] = merge(columns[column], excluded[column])
+            column = f"{field}_sum"
+            update[column] = columns[column] + excluded[column]
+        db.execute(statement.on_conflict_do_update(
+            index_elements=["location", "resolution", "bucket"], set_=update
+        ), rollups)
+
+    @staticmethod
+    def move_rollups(db: Session, source: str, key: str):
+        """
+        Merge rollups of one location into rollups of another
+         and delete them. Changes are not committed.
+        :param db: db session.
+        :param source: location rollups are stored under.
+        :param key: location to merge rollups into.
+        :return: nothing
+        """
+        query = db.query(WeatherRollupDB).filter_by(location=source)
+        columns = [c.name for c in WeatherRollupDB.__table__.c
+                   if c.name != "id"]
+        HistoryService.upsert_rollups(db, [
+            {**{c: getattr(row, c) for c in columns}, "location": key}
+            for row in query
+        ])
+        query.delete(synchronize_session=False)
+
+    @staticmethod
+    def rebuild_rollups(db: Session, batch_size: int = 1000):
+        """
+        Build rollups from all stored snapshots, e.g. for history
+         stored before rollups existed. Changes are not committed.
+        :param db: db session.
+        :param batch_size: number of snapshots read at once.
+        :return: nothing
+        """
+        db.query(WeatherRollupDB).delete()
+        batch = []
+        for row in db.query(WeatherCacheDB).yield_per(batch_size):
+            batch.append(row.to_dict())
+            if len(batch) == batch_size:
+                HistoryService.add_to_rollups(db, batch)
+                batch = []
+        HistoryService.add_to_rollups(db, batch)
+
+    @staticmethod
+    def aggregate(rollup: dict, field: str, value: float):
+        """
+        Add value to min, max and sum of field in rollup.
+        :param rollup: rollup values.
+        :param field: field.
+        :param value: value.
+        :return: nothing
+        """
+        rollup[f"{field}_min"] = min(rollup.get(f"{field}_min", value), value)
+        rollup[f"{field}_max"] = max(rollup.get(f"{field}_max", value), value)
+        rollup[f"{field}_sum"] = rollup.get(f"{field}_sum", 0.0) + value
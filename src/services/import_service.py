@@ -0,0 +1,180 @@
+import csv
+import json
+from typing import IO, Iterable, Iterator
+
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from models.models import WeatherCacheDB
+from schemas.schemas import WeatherObservation
+from services.alert_service import AlertBackgroundService
+from services.history_service import HistoryService
+from services.location_service import location_resolver
+
+
+class ImportService:
+    """
+    Service for importing historical weather observations in bulk.
+    Observations are validated and inserted in batches
+     and committed in large transactions.
+    """
+    adapter = TypeAdapter(list[WeatherObservation])
+
+    def __init__(self, db: Session, replay_alerts: bool = False):
+        """
+        Initialization of service.
+        :param db: db session.
+        :param replay_alerts: evaluate alerts for imported observations.
+        """
+        self.db = db
+        self.replay_alerts = replay_alerts
+        self.keys = {}
+        self.result = {"imported": 0, "rejected": 0, "errors": []}
+
+    @staticmethod
+    def read(stream: IO[str], import_format: str) -> Iterator[tuple]:
+        """
+        Read observations from NDJSON or CSV.
+        :param stream: text stream.
+        :param import_format: "ndjson" or "csv".
+        :return: iterator over line numbers and observations.
+        """
+        if import_format == "csv":
+            return ImportService.read_csv(stream)
+        return ImportService.read_ndjson(stream)
+
+    @staticmethod
+    def read_ndjson(stream: IO[str]) -> Iterator[tuple]:
+        """
+        Read observations from NDJSON, one object per line.
+        Lines that aren't JSON are returned as None and rejected later.
+        :param stream: text stream.
+        :return: iterator over line numbers and observations.
+        """
+        for number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                yield number, json.loads(line)
+            except json.JSONDecodeError:
+                yield number, None
+
+    @staticmethod
+    def read_csv(stream: IO[str]) -> Iterator[tuple]:
+        """
+        Read observations from CSV with header, empty cells are omitted.
+        :param stream: text stream.
+        :return: iterator over line numbers and observations.
+        """
+        for number, row in enumerate(csv.DictReader(stream), 2):
+            yield number, {field: value for field, value in row.items()
+                           if value not in ("", None)}
+
+    def import_rows(self, rows: Iterable[tuple]) -> dict:
+        """
+        Validate and insert observations. If import fails, uncommitted
+         changes are rolled back and alert states of its locations
+         are loaded again from db.
+        :param rows: line numbers and observations.
+        :return: numbers of imported and rejected observations
+         and errors of the first rejected ones.
+        """
+        batch, pending = [], 0
+        try:
+            for row in rows:
+                batch.append(row)
+                if len(batch) < settings.import_batch_size:
+                    continue
+                pending += self.import_batch(batch)
+                batch = []
+                if pending >= settings.import_commit_size:
+                    self.db.commit()
+                    pending = 0
+            self.import_batch(batch)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            AlertBackgroundService.invalidate(self.keys.values())
+            raise
+        return self.result
+
+    def import_batch(self, batch: list[tuple]) -> int:
+        """
+        Validate and insert batch of observations with one statement.
+        Changes are not committed.
+        :param batch: line numbers and observations.
+        :return: number of inserted observations.
+        """
+        observations = self.validate(batch)
+        if not observations:
+            return 0
+        snapshots = [self.to_snapshot(observation)
+                     for observation in observations]
+        self.db.execute(insert(WeatherCacheDB.__table__), snapshots)
+        HistoryService.add_to_rollups(self.db, snapshots)
+        if self.replay_alerts:
+            AlertBackgroundService.add_notifications(self.db, snapshots)
+        self.result["imported"] += len(snapshots)
+        return len(snapshots)
+
+    def validate(self, batch: list[tuple]) -> list[WeatherObservation]:
+        """
+        Validate batch of observations at once, recording errors
+         of invalid ones and validating the rest again.
+        :param batch: line numbers and observations.
+        :return: valid observations.
+        """
+        values = [value for _, value in batch]
+        try:
+            return self.adapter.validate_python(values)
+        except ValidationError as e:
+            invalid = {}
+            for error in e.errors():
+                index, field = error["loc"][0], error["loc"][1:]
+                message = error["msg"]
+                if field:
+                    message = f"{'.'.join(map(str, field))}: {message}"
+                invalid.setdefault(index, message)
+        for index in sorted(invalid):
+            self.reject(batch[index][0], invalid[index])
+        return self.adapter.validate_python(
+            [value for i, value in enumerate(values) if i not in invalid]
+        )
+
+    def reject(self, line: int, message: str):
+        """
+        Record rejected observation.
+        :param line: line number.
+        :param message: error.
+        :return: nothing
+        """
+        self.result["rejected"] += 1
+        if len(self.result["errors"]) < settings.import_max_errors:
+            self.result["errors"].append({"line": line, "error": message})
+
+    def to_snapshot(self, observation: WeatherObservation) -> dict:
+        """
+        Convert observation to row of weather cache.
+        :param observation: observation.
+        :return: weather data with location key and naive UTC timestamps.
+        """
+        weather_data = observation.model_dump()
+        weather_data["location"] = self.key_for(weather_data["location"])
+        for field in ("timestamp", "sunrise", "sunset"):
+            weather_data[field] = WeatherCacheDB.to_datetime(
+                weather_data[field]
+            )
+        return weather_data
+
+    def key_for(self, location: str) -> str:
+        """
+        Get location key, remembering it for the rest of import.
+        :param location: location name.
+        :return: location key.
+        """
+        if location not in self.keys:
+            self.keys[location] = location_resolver.key_for(self.db,
+                                                            location)
+        return self.keys[location]
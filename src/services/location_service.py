@@ -0,0 +1,190 @@
+import re
+import threading
+import unicodedata
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from models.models import (LocationAliasDB, SavedLocationDB,
+                           WeatherAlertDB, WeatherCacheDB)
+from services.alert_index import alert_index
+from services.alert_state import alert_states
+from services.archive_service import archive_service
+from services.history_service import HistoryService
+
+
+class LocationResolver:
+    """
+    Service for mapping location names to canonical location keys,
+     so that every spelling of a place shares one cache entry.
+    """
+    def __init__(self):
+        """
+        Initialization of resolver.
+        """
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(location: str) -> str:
+        """
+        Normalize case, whitespace and unicode of location name.
+        :param location: location name, e.g. " São  Paulo , BR".
+        :return: normalized name, e.g. "sao paulo,br".
+        """
+        decomposed = unicodedata.normalize("NFKD", location)
+        stripped = "".join(c for c in decomposed
+                           if not unicodedata.combining(c))
+        collapsed = re.sub(r"\s+", " ", stripped.casefold()).strip()
+        return re.sub(r"\s*,\s*", ",", collapsed)
+
+    def resolve(self, db: Session, location: str) -> Optional[str]:
+        """
+        Get canonical key of location from memory, falling back to
+         the alias table.
+        :param db: db session.
+        :param location: location name.
+        :return: canonical key or None if location wasn't resolved yet.
+        """
+        alias = self.normalize(location)
+        with self._lock:
+            key = self._keys.get(alias)
+        if key is not None:
+            return key
+
+        row = db.query(LocationAliasDB).filter_by(alias=alias).first()
+        if row is None or row.location is None:
+            return None
+        with self._lock:
+            self._keys[alias] = row.location
+        return row.location
+
+    def key_for(self, db: Session, location: str) -> str:
+        """
+        Get the best known key of location without asking OpenWeather.
+        :param db: db session.
+        :param location: location name.
+        :return: canonical key or normalized name if it is unknown.
+        """
+        return self.resolve(db, location) or self.normalize(location)
+
+    def register(self, db: Session, location: str, data: dict) -> str:
+        """
+        Remember canonical key of location from OpenWeather response
+         under requested name and under "name,country" of response,
+         and move alerts, saved locations, history, rollups and archive
+         stored under the requested name or under a name key it used
+         to point at. Data under key of another city is never moved,
+         so places sharing name and country keep their own data.
+         Versions of alerts are incremented if alerts were moved.
+         Changes are not committed.
+        :param db: db session.
+        :param location: requested location name.
+        :param data: OpenWeather response for location.
+        :return: canonical key.
+        """
+        alias = self.normalize(location)
+        key = self.canonical_key(data) or alias
+        sources = {alias}
+        for name in {alias, key, self.display_name(data)} - {None}:
+            row = db.query(LocationAliasDB).filter_by(alias=name).first()
+            if row is None:
+                row = LocationAliasDB(alias=name)
+                db.add(row)
+            elif row.location and not self.is_canonical(row.location):
+                sources.add(row.location)
+            row.city_id = data.get("id", row.city_id)
+            row.location = key
+        sources.discard(key)
+
+        if sources:
+            db.query(LocationAliasDB).filter(
+                LocationAliasDB.location.in_(sources)
+            ).update({"location": key}, synchronize_session=False)
+            moved = [source for source in sources
+                     if self.move(db, source, key)]
+            if moved:
+                alert_index.touch(db, moved + [key])
+            for name in sources | {key}:
+                alert_index.invalidate(name)
+                alert_states.invalidate(name)
+
+        with self._lock:
+            for name in [name for name, value in self._keys.items()
+                         if value in sources]:
+                self._keys[name] = key
+            self._keys[alias] = key
+            self._keys[key] = key
+        return key
+
+    @staticmethod
+    def move(db: Session, source: str, key: str) -> bool:
+        """
+        Move data stored under one location key to another,
+         merging rollups into rollups of the same buckets and archived
+         months into archived months of the key.
+        :param db: db session.
+        :param source: key data is stored under.
+        :param key: key to move data to.
+        :return: True if alerts were moved, else False
+        """
+        moved = {}
+        for model, column in ((WeatherAlertDB, "location_key"),
+                              (SavedLocationDB, "location_key"),
+                              (WeatherCacheDB, "location")):
+            moved[model] = db.query(model).filter(
+                getattr(model, column) == source
+            ).update({column: key}, synchronize_session=False)
+        HistoryService.move_rollups(db, source, key)
+        archive_service.move(source, key)
+        return bool(moved[WeatherAlertDB])
+
+    @staticmethod
+    def canonical_key(data: dict) -> Optional[str]:
+        """
+        Get canonical key from OpenWeather response. Key is made of
+         city id, or of coordinates rounded to 0.01 degree if there
+         is no id, because names are shared by different places.
+        :param data: OpenWeather response.
+        :return: key, e.g. "city:524901" or "coord:55.75,37.62",
+         None if response has neither id nor coordinates.
+        """
+        if data.get("id"):
+            return f"city:{data['id']}"
+        coord = data.get("coord") or {}
+        if coord.get("lat") is None or coord.get("lon") is None:
+            return None
+        return f"coord:{coord['lat']:.2f},{coord['lon']:.2f}"
+
+    @staticmethod
+    def is_canonical(key: str) -> bool:
+        """
+        Check if key was made from city id or coordinates.
+        :param key: location key.
+        :return: True if key is canonical, False if it is a name
+        """
+        return key.startswith(("city:", "coord:"))
+
+    def display_name(self, data: dict) -> Optional[str]:
+        """
+        Get normalized name of place from OpenWeather response.
+         It is registered as alias of canonical key.
+        :param data: OpenWeather response.
+        :return: normalized "name,country" or None if name is missing.
+        """
+        name = data.get("name")
+        if not name:
+            return None
+        country = data.get("sys", {}).get("country")
+        return self.normalize(f"{name},{country}" if country else name)
+
+    def clear(self):
+        """
+        Forget keys kept in memory.
+        :return: nothing
+        """
+        with self._lock:
+            self._keys.clear()
+
+
+location_resolver = LocationResolver()
@@ -0,0 +1,130 @@
+import base64
+import binascii
+import json
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models.models import NotificationDB, UserDB
+
+
+class NotificationService:
+    """
+    Service for reading notifications of user. Notifications are read
+     in order of id with keyset pagination over (user_id, id) index,
+     so cost of a page or of unread count doesn't depend on number
+     of notifications user ever received. Id follows order in which
+     notifications were committed, unlike their timestamp, which is
+     time of weather data and can be older for replayed snapshots.
+    """
+
+    @staticmethod
+    def encode_cursor(row_id: int) -> str:
+        """
+        Make opaque cursor pointing at notification.
+        :param row_id: id of notification.
+        :return: cursor.
+        """
+        return base64.urlsafe_b64encode(json.dumps(row_id).encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> int:
+        """
+        Get id of notification from opaque cursor.
+        :param cursor: cursor.
+        :return: id of notification.
+        """
+        try:
+            return int(json.loads(base64.urlsafe_b64decode(cursor)))
+        except (binascii.Error, ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    @staticmethod
+    def get_page(db: Session, user_id: int, limit: int = 100,
+                 cursor: Optional[str] = None,
+                 since: Optional[str] = None):
+        """
+        Get page of notifications of user. Without since notifications
+         are ordered from newest to oldest and cursor points
+         at older ones. With since only notifications added after it
+         are returned from oldest to newest, so that polling with
+         cursor of the latest returned one doesn't skip any.
+        :param db: db session.
+        :param user_id: id of user.
+        :param limit: maximum number of notifications.
+        :param cursor: cursor returned with previous page,
+         include only notifications older than it.
+        :param since: cursor of the latest notification client has,
+         include only notifications newer than it.
+        :return: notifications, cursor of the next page of older ones,
+         None if it is the last, and cursor of the latest notification
+         client has after this page, None if it is unknown.
+        """
+        query = db.query(NotificationDB).filter(
+            NotificationDB.user_id == user_id
+        )
+        if since is not None:
+            since_id = NotificationService.decode_cursor(since)
+            rows = query.filter(NotificationDB.id > since_id).order_by(
+                NotificationDB.id
+            ).limit(limit).all()
+            latest = rows[-1].id if rows else since_id
+            return rows, None, NotificationService.encode_cursor(latest)
+
+        if cursor is not None:
+            query = query.filter(
+                NotificationDB.id < NotificationService.decode_cursor(cursor)
+            )
+        rows = query.order_by(NotificationDB.id.desc()).limit(limit + 1).all()
+        latest = None
+        if rows and cursor is None:
+            latest = NotificationService.encode_cursor(rows[0].id)
+        if len(rows) <= limit:
+            return rows, None, latest
+        rows = rows[:limit]
+        return (rows, NotificationService.encode_cursor(rows[-1].id),
+                latest)
+
+    @staticmethod
+    def count_unread(db: Session, user: UserDB) -> int:
+        """
+        Count notifications after read position of user,
+         the count is answered by range of the index.
+        :param db: db session.
+        :param user: user.
+        :return: number of unread notifications.
+        """
+        query = db.query(func.count()).select_from(NotificationDB).filter(
+            NotificationDB.user_id == user.id
+        )
+        if user.notifications_read_id is not None:
+            query = query.filter(
+                NotificationDB.id > user.notifications_read_id
+            )
+        return query.scalar()
+
+    @staticmethod
+    def mark_read(db: Session, user: UserDB, cursor: Optional[str] = None):
+        """
+        Move read position of user forward to notification of cursor
+         or to the latest notification. Position is never moved back.
+        :param db: db session.
+        :param user: user.
+        :param cursor: cursor of notification, the latest if None.
+        :return: nothing
+        """
+        if cursor is not None:
+            position = NotificationService.decode_cursor(cursor)
+        else:
+            position = db.query(func.max(NotificationDB.id)).filter(
+                NotificationDB.user_id == user.id
+            ).scalar()
+            if position is None:
+                return
+
+        if (user.notifications_read_id is None
+                or position > user.notifications_read_id):
+            user.notifications_read_id = position
+            db.commit()
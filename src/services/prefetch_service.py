@@ -0,0 +1,132 @@
+import asyncio
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.database import SessionLocal
+from models.models import SavedLocationDB, WeatherCacheDB
+
+
+class PrefetchService:
+    """
+    Service for refreshing saved locations shortly before
+     their cached weather data expires.
+    """
+    def __init__(self, weather_service, session_factory=SessionLocal):
+        """
+        Initialization of service.
+        :param weather_service: weather service used for refreshing.
+        :param session_factory: factory of db sessions.
+        """
+        self.weather_service = weather_service
+        self.session_factory = session_factory
+        self._task = None
+
+    def start(self):
+        """
+        Start refreshing in background.
+        :return: nothing
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """
+        Stop refreshing and wait for background task to finish.
+        :return: nothing
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self):
+        """
+        Main refreshing loop.
+        :return: nothing
+        """
+        while True:
+            try:
+                await self.refresh_due()
+            except Exception as e:
+                print(f"Prefetch failed: {e}")
+            await asyncio.sleep(settings.prefetch_interval_seconds)
+
+    def due_locations(self, db: Session) -> list[str]:
+        """
+        Get distinct keys of saved locations that have no snapshot
+         or whose latest snapshot expires within prefetch lead time.
+        :param db: db session.
+        :return: list of location keys.
+        """
+        saved = [key for (key,) in
+                 db.query(SavedLocationDB.location_key).distinct()
+                 if key is not None]
+
+        latest = dict(
+            db.query(WeatherCacheDB.location,
+                     func.max(WeatherCacheDB.timestamp))
+            .filter(WeatherCacheDB.location.in_(saved))
+            .group_by(WeatherCacheDB.location)
+            .all()
+        )
+        return [
+            key for key in saved
+            if key not in latest
+            or self.weather_service.remaining_freshness(latest[key])
+            <= settings.prefetch_lead_seconds
+        ]
+
+    async def refresh_due(self):
+        """
+        Refresh due locations in batches of group size. Start of batches
+         is spread over prefetch spread time and number of batches
+         refreshing at once is limited by prefetch concurrency.
+        :return: nothing
+        """
+        db = self.session_factory()
+        try:
+            locations = self.due_locations(db)
+        finally:
+            db.close()
+        if not locations:
+            return
+
+        size = settings.openweather_group_size
+        batches = [locations[i:i + size]
+                   for i in range(0, len(locations), size)]
+        spacing = settings.prefetch_spread_seconds / len(batches)
+        semaphore = asyncio.Semaphore(settings.prefetch_concurrency)
+        await asyncio.gather(*[
+            self.refresh_batch(batch, index * spacing, semaphore)
+            for index, batch in enumerate(batches)
+        ])
+
+    async def refresh_batch(self, locations: list[str], delay: float,
+                            semaphore: asyncio.Semaphore):
+        """
+        Refresh one batch of locations in its own db session.
+        :param locations: locations.
+        :param delay: seconds to wait before starting.
+        :param semaphore: semaphore limiting concurrent batches.
+        :return: nothing
+        """
+        await asyncio.sleep(delay)
+        async with semaphore:
+            db = self.session_factory()
+            try:
+                _refreshed, failures = await (
+                    self.weather_service.refresh_many_weather_data(
+                        db, locations
+                    )
+                )
+                for location, detail in failures.items():
+                    print(f"Prefetch of {location} failed: {detail}")
+            except Exception as e:
+                print(f"Prefetch of {locations} failed: {e}")
+            finally:
+                db.close()
@@ -0,0 +1,67 @@
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+class ProcessLock:
+    """
+    Exclusive lock of a file, held by one process at a time. It is used
+     to elect the process that runs a background service when app is
+     served by several worker processes. Lock is released by operating
+     system if process exits without releasing it.
+    """
+    def __init__(self, path: Path):
+        """
+        Initialization of lock.
+        :param path: path of lock file.
+        """
+        self.path = path
+        self._file = None
+
+    @property
+    def held(self) -> bool:
+        """
+        Check if lock is held by this process.
+        :return: True if lock is held, else False
+        """
+        return self._file is not None
+
+    def acquire(self) -> bool:
+        """
+        Try to take lock without waiting.
+        :return: True if lock is held by this process, else False
+        """
+        if self._file is not None:
+            return True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        file = open(self.path, "a+")
+        try:
+            if fcntl is not None:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            file.close()
+            return False
+        self._file = file
+        return True
+
+    def release(self):
+        """
+        Release lock if it is held.
+        :return: nothing
+        """
+        if self._file is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._file.close()
+        self._file = None
@@ -0,0 +1,121 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.database import SessionLocal, incremental_vacuum
+from models.models import NotificationDB, WeatherCacheDB, WeatherRollupDB
+from services.archive_service import archive_service
+
+
+class RetentionService:
+    """
+    Service for deleting old weather history and notifications.
+    Raw snapshots are kept for weather raw retention days,
+     after that history is kept only as rollups. Retention applies
+     to archived snapshots as well, archive after days only decides
+     where snapshots are kept until then.
+    """
+    def __init__(self, session_factory=SessionLocal):
+        """
+        Initialization of service.
+        :param session_factory: factory of db sessions.
+        """
+        self.session_factory = session_factory
+        self._task = None
+
+    def start(self):
+        """
+        Start purging in background.
+        :return: nothing
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """
+        Stop purging and wait for background task to finish.
+        :return: nothing
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self):
+        """
+        Main purging loop. Deleting runs in a thread,
+         so that it doesn't block the event loop.
+        :return: nothing
+        """
+        while True:
+            try:
+                await asyncio.to_thread(self.purge)
+            except Exception as e:
+                print(f"Retention failed: {e}")
+            await asyncio.sleep(settings.retention_interval_seconds)
+
+    def purge(self) -> dict:
+        """
+        Delete rows and archived snapshots that are older than their
+         retention and return freed pages to the file system.
+        :return: number of deleted rows by table,
+         and of archived snapshots under archive.
+        """
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        rules = [
+            (WeatherCacheDB, WeatherCacheDB.timestamp,
+             settings.weather_raw_retention_days, None),
+            (WeatherRollupDB, WeatherRollupDB.bucket,
+             settings.weather_hourly_retention_days,
+             WeatherRollupDB.resolution == "hour"),
+            (NotificationDB, NotificationDB.timestamp,
+             settings.notification_retention_days, None),
+        ]
+        deleted = {}
+        db = self.session_factory()
+        try:
+            for model, column, days, condition in rules:
+                if days <= 0:
+                    continue
+                criteria = [column < now - timedelta(days=days)]
+                if condition is not None:
+                    criteria.append(condition)
+                deleted[model.__tablename__] = self.delete_in_batches(
+                    db, model, criteria
+                )
+            incremental_vacuum(db)
+        finally:
+            db.close()
+        if settings.weather_raw_retention_days > 0:
+            deleted["archive"] = archive_service.purge(
+                now - timedelta(days=settings.weather_raw_retention_days)
+            )
+        return deleted
+
+    @staticmethod
+    def delete_in_batches(db: Session, model, criteria: list) -> int:
+        """
+        Delete rows matching criteria, committing after every batch,
+         so that write lock is never held for long.
+        :param db: db session.
+        :param model: model of table.
+        :param criteria: filter criteria.
+        :return: number of deleted rows.
+        """
+        deleted = 0
+        while True:
+            ids = [row_id for (row_id,) in db.query(model.id).filter(
+                *criteria
+            ).limit(settings.retention_batch_size)]
+            if not ids:
+                return deleted
+            db.query(model).filter(model.id.in_(ids)).delete(
+                synchronize_session=False
+            )
+            db.commit()
+            deleted += len(ids)
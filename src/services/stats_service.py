@@ -0,0 +1,116 @@
+import warnings
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models.models import WeatherCacheDB
+from services.archive_service import archive_service
+from services.history_service import HistoryService
+
+
+class StatsService:
+    """
+    Service for computing statistics of weather history. History
+     is loaded as one float matrix with a column per field, so that
+     every aggregate is computed for all fields at once.
+    """
+    fields = ("temperature", "temperature_feels_like", "temperature_min",
+              "temperature_max", "pressure", "humidity", "visibility",
+              "wind_speed", "wind_deg")
+
+    @staticmethod
+    def check_request(fields: list[str], percentiles: list[float]):
+        """
+        Check that fields and percentiles can be computed.
+        :param fields: fields.
+        :param percentiles: percentiles.
+        :return: nothing
+        """
+        unknown = [field for field in fields
+                   if field not in StatsService.fields]
+        if unknown:
+            raise HTTPException(status_code=400,
+                                detail=f"Unknown fields: {unknown}")
+        if any(not 0 <= q <= 100 for q in percentiles):
+            raise HTTPException(status_code=400,
+                                detail="Percentiles must be in [0, 100]")
+
+    @staticmethod
+    def load(db: Session, key: str, fields: list[str],
+             start: Optional[datetime] = None,
+             end: Optional[datetime] = None) -> np.ndarray:
+        """
+        Load fields of archived and stored snapshots in time range
+         into matrix.
+        :param db: db session.
+        :param key: canonical location key.
+        :param fields: fields.
+        :param start: include rows at or after start.
+        :param end: include rows before end.
+        :return: matrix with a row per snapshot and a column per field,
+         missing values are NaN.
+        """
+        query = select(*[getattr(WeatherCacheDB, field) for field in fields])
+        query = query.where(WeatherCacheDB.location == key)
+        start, end = HistoryService.to_utc(start), HistoryService.to_utc(end)
+        if start is not None:
+            query = query.where(WeatherCacheDB.timestamp >= start)
+        if end is not None:
+            query = query.where(WeatherCacheDB.timestamp < end)
+        rows = [tuple(row) for row in db.execute(query)]
+        return np.vstack([
+            archive_service.load(key, fields, start, end),
+            np.array(rows, dtype=np.float64).reshape(-1, len(fields)),
+        ])
+
+    @staticmethod
+    def compute(matrix: np.ndarray, fields: list[str],
+                percentiles: list[float]) -> dict:
+        """
+        Compute min, max, mean, standard deviation and percentiles
+         of every column of matrix, ignoring NaN.
+        :param matrix: matrix with a column per field.
+        :param fields: fields.
+        :param percentiles: percentiles.
+        :return: statistics by field.
+        """
+        if not len(matrix):
+            return {field: {"percentiles": {str(q): None
+                                            for q in percentiles}}
+                    for field in fields}
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            aggregates = {
+                "min": np.nanmin(matrix, axis=0),
+                "max": np.nanmax(matrix, axis=0),
+                "mean": np.nanmean(matrix, axis=0),
+                "std": np.nanstd(matrix, axis=0),
+            }
+            quantiles = (np.nanpercentile(matrix, percentiles, axis=0)
+                         if percentiles else np.empty((0, len(fields))))
+        return {
+            field: {
+                **{name: StatsService.to_float(values[i])
+                   for name, values in aggregates.items()},
+                "percentiles": {
+                    str(q): StatsService.to_float(quantiles[j][i])
+                    for j, q in enumerate(percentiles)
+                },
+            }
+            for i, field in enumerate(fields)
+        }
+
+    @staticmethod
+    def to_float(value) -> Optional[float]:
+        """
+        Convert numpy value to float, NaN of a column without values
+         is converted to None.
+        :param value: value.
+        :return: float or None.
+        """
+        return None if np.isnan(value) else float(value)
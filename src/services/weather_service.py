@@ -1,10 +1,27 @@
+import asyncio
 from datetime import datetime, timedelta, timezone
-import requests
+from typing import NamedTuple, Optional
+import httpx
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
-from models.models import WeatherCacheDB
+from models.models import LocationAliasDB, WeatherCacheDB
 from core.config import settings
-from services.alert_service import AlertBackgroundService
+from core.database import SessionLocal
+from services.alert_service import AlertWorkerPool
+from services.cache_service import SingleFlight, TTLCache
+from services.circuit_breaker import CircuitBreaker
+from services.history_service import HistoryService
+from services.location_service import location_resolver
+from services.process_lock import ProcessLock
+
+
+class WeatherSnapshot(NamedTuple):
+    """
+    Weather data together with time it was fetched at.
+    """
+    data: dict
+    timestamp: datetime
+    stale: bool = False
 
 
 class WeatherService:
@@ -16,67 +33,439 @@ class WeatherService:
         Initialization of service.
         """
         self.api_key = settings.openweather_api_key
-        self.service = AlertBackgroundService()
-        self.service.start()
+        self.ttl = timedelta(minutes=settings.weather_cache_ttl_minutes)
+        self.stale_ttl = max(
+            self.ttl,
+            timedelta(minutes=settings.weather_cache_stale_ttl_minutes)
+        )
+        self.memory_cache = TTLCache(
+            max_size=settings.weather_cache_max_size,
+            ttl=self.stale_ttl.total_seconds()
+        )
+        self.not_found_cache = TTLCache(
+            max_size=settings.weather_cache_max_size,
+            ttl=settings.weather_not_found_ttl_seconds
+        )
+        self.flights = SingleFlight()
+        self.resolver = location_resolver
+        self.breaker = CircuitBreaker(
+            failure_threshold=settings.openweather_failure_threshold,
+            reset_timeout=settings.openweather_reset_timeout_seconds
+        )
+        self.client = None
+        self.session_factory = SessionLocal
+        self.background_tasks = {}
+        self.service = AlertWorkerPool(
+            settings.alert_workers,
+            lock=ProcessLock(settings.database_path / "alert_engine.lock")
+        )
+
+    def remaining_freshness(self, timestamp: datetime,
+                            ttl: Optional[timedelta] = None) -> float:
+        """
+        Get number of seconds for which cached snapshot stays fresh.
+        :param timestamp: timestamp of snapshot.
+        :param ttl: time to live, soft ttl if not given.
+        :return: seconds left, zero or negative if snapshot is expired.
+        """
+        age = (datetime.now(timezone.utc)
+               - timestamp.replace(tzinfo=timezone.utc))
+        return ((ttl or self.ttl) - age).total_seconds()
+
+    @staticmethod
+    def get_latest_row(db: Session, key: str) -> Optional[WeatherCacheDB]:
+        """
+        Get the latest stored snapshot of location.
+        :param db: db session
+        :param key: canonical location key
+        :return: cached weather or None if there is no snapshot
+        """
+        return (db.query(WeatherCacheDB)
+                .filter_by(location=key)
+                .order_by(WeatherCacheDB.timestamp.desc())
+                .first())
+
+    def get_cached_snapshot(self, db: Session,
+                            key: str) -> Optional[WeatherSnapshot]:
+        """
+        Get snapshot younger than stale ttl from memory,
+         falling back to the database.
+        :param db: db session
+        :param key: canonical location key
+        :return: snapshot or None if there is no usable snapshot
+        """
+        cached = self.memory_cache.get(key)
+        if cached is None:
+            row = self.get_latest_row(db, key)
+            if row is None:
+                return None
+            remaining = self.remaining_freshness(row.timestamp,
+                                                 self.stale_ttl)
+            if remaining <= 0:
+                return None
+            cached = (row.to_dict(),
+                      row.timestamp.replace(tzinfo=timezone.utc))
+            self.memory_cache.set(key, cached, ttl=remaining)
+
+        data, timestamp = cached
+        return WeatherSnapshot(data, timestamp,
+                               self.remaining_freshness(timestamp) <= 0)
+
+    def get_client(self) -> httpx.AsyncClient:
+        """
+        Get shared OpenWeather client, creating it on first use.
+        :return: async http client with keep-alive connection pool
+        """
+        if self.client is None or self.client.is_closed:
+            self.client = httpx.AsyncClient(
+                base_url=settings.openweather_url,
+                timeout=httpx.Timeout(
+                    settings.openweather_timeout,
+                    connect=settings.openweather_connect_timeout
+                ),
+                limits=httpx.Limits(
+                    max_connections=settings.openweather_max_connections,
+                    max_keepalive_connections=(
+                        settings.openweather_max_keepalive_connections),
+                    keepalive_expiry=settings.openweather_keepalive_expiry
+                )
+            )
+        return self.client
+
+    async def close(self):
+        """
+        Close shared OpenWeather client and its connections.
+        :return: nothing
+        """
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
 
-    def get_weather_data(self, db: Session, location: str):
+    async def get_weather_data(self, db: Session, location: str):
         """
         Get weather data for a location.
         :param db: db session
         :param location: location
         :return: weather data
         """
-        cached = db.query(WeatherCacheDB).filter_by(
-            location=location.lower()
-        ).first()
+        return (await self.get_weather_snapshot(db, location)).data
+
+    async def get_weather_snapshot(self, db: Session,
+                                   location: str) -> WeatherSnapshot:
+        """
+        Get weather snapshot for a location. Snapshot older than soft ttl
+         but younger than stale ttl is returned at once as stale,
+         while it is refreshed in background. Locations not found
+         recently fail at once, and if OpenWeather is unavailable,
+         the latest snapshot of any age is returned as stale.
+        :param db: db session
+        :param location: location
+        :return: weather snapshot
+        """
+        key = self.resolver.key_for(db, location)
+        snapshot = self.get_cached_snapshot(db, key)
+        if snapshot is not None:
+            if snapshot.stale:
+                self.refresh_in_background(key, location)
+            return snapshot
 
-        if (cached is not None and
-                datetime.now(timezone.utc)
-                - cached.timestamp.replace(tzinfo=timezone.utc)
-                < timedelta(minutes=30)):
-            return cached.data
+        detail = self.not_found_cache.get(key)
+        if detail is not None:
+            raise HTTPException(status_code=404, detail=detail)
 
         try:
-            url = (f"http://api.openweathermap.org/data/2.5/"
-                   f"weather?q={location}&appid={self.api_key}&units=metric")
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            weather_data = {
-                "lat": data['coord']['lat'],
-                "lon": data['coord']['lon'],
-                "location": location,
-                "main_weather": data['weather'][0]['main'],
-                "icon": data['weather'][0]['icon'],
-                "description": data['weather'][0]['description'],
-                "temperature": data['main']['temp'],
-                "temperature_feels_like": data['main']['feels_like'],
-                "temperature_min": data['main']['temp_min'],
-                "temperature_max": data['main']['temp_max'],
-                "pressure": data['main']['pressure'],
-                "humidity": data['main']['humidity'],
-                "visibility": data['visibility'],
-                "wind_speed": data['wind']['speed'],
-                "wind_deg": data['wind']['deg'],
-                "sunrise": data['sys']['sunrise'],
-                "sunset": data['sys']['sunset'],
-                "timestamp": datetime.now(timezone.utc)
-            }
-
-            new_cache = WeatherCacheDB(
-                location=location.lower(),
-                data=weather_data,
-                timestamp=datetime.now(timezone.utc)
+            weather_data = await self.flights.do(
+                key, lambda: self.fetch_weather_data(db, location)
+            )
+        except HTTPException as e:
+            snapshot = self.get_last_snapshot(db, key)
+            if e.status_code < 500 or snapshot is None:
+                raise
+            return snapshot
+        return WeatherSnapshot(weather_data, weather_data["timestamp"])
+
+    @staticmethod
+    def get_last_snapshot(db: Session,
+                          key: str) -> Optional[WeatherSnapshot]:
+        """
+        Get the latest snapshot of any age, marked as stale.
+        Used when OpenWeather is unavailable.
+        :param db: db session
+        :param key: canonical location key
+        :return: snapshot or None if there is no snapshot
+        """
+        row = WeatherService.get_latest_row(db, key)
+        if row is None:
+            return None
+        return WeatherSnapshot(row.to_dict(),
+                               row.timestamp.replace(tzinfo=timezone.utc),
+                               stale=True)
+
+    def refresh_in_background(self, key: str, location: str):
+        """
+        Start refresh of location in background
+         unless it is being refreshed already.
+        :param key: canonical location key
+        :param location: location
+        :return: nothing
+        """
+        if key in self.flights or key in self.background_tasks:
+            return
+        task = asyncio.create_task(self.flights.do(
+            key, lambda: self.refresh_with_own_session(location)
+        ))
+        self.background_tasks[key] = task
+        task.add_done_callback(
+            lambda _task: self.background_tasks.pop(key, None)
+        )
+
+    async def refresh_with_own_session(self, location: str):
+        """
+        Refresh location in a db session that is not bound to a request.
+        :param location: location
+        :return: weather data or None if refresh failed
+        """
+        db = self.session_factory()
+        try:
+            return await self.refresh_weather_data(db, location)
+        except Exception as e:
+            print(f"Background refresh of {location} failed: {e}")
+            return None
+        finally:
+            db.close()
+
+    async def fetch_weather_data(self, db: Session, location: str):
+        """
+        Fetch weather data for a location from OpenWeather and cache it.
+        Only one fetch per location is in flight at a time,
+         so snapshot stored by the previous one is checked first.
+        :param db: db session
+        :param location: location
+        :return: weather data
+        """
+        cached = self.memory_cache.get(self.resolver.key_for(db, location))
+        if cached is not None and self.remaining_freshness(cached[1]) > 0:
+            return cached[0]
+        return await self.refresh_weather_data(db, location)
+
+    async def refresh_weather_data(self, db: Session, location: str):
+        """
+        Fetch weather data for a location from OpenWeather and store it
+         under canonical key of location, remembering city id
+         of location for batched refreshes.
+        :param db: db session
+        :param location: location
+        :return: weather data
+        """
+        try:
+            data = await self.request_openweather(
+                "/weather", {"q": location}
             )
-            self.service.add_item(weather_data)
-            db.add(new_cache)
-            db.commit()
+        except HTTPException as e:
+            if e.status_code == 404:
+                self.not_found_cache.set(self.resolver.normalize(location),
+                                         e.detail)
+            raise
+        try:
+            key = self.resolver.register(db, location, data)
+            weather_data = self.parse_weather_data(data, key)
+            self.store_weather_data(db, [weather_data])
             return weather_data
         except Exception as e:
             db.rollback()
             raise HTTPException(status_code=502,
                                 detail=str(e))
 
-        except requests.RequestException as e:
+    async def refresh_many_weather_data(self, db: Session,
+                                        locations: list[str]
+                                        ) -> tuple[dict, dict]:
+        """
+        Refresh weather data for several locations. Locations with known
+         city id are fetched by groups, up to group size cities per request,
+         the others are fetched one by one. Failure of one location
+         or group doesn't stop the others, and locations that were
+         recently not found are skipped.
+        :param db: db session
+        :param locations: locations
+        :return: weather data by canonical location key
+         and errors by location
+        """
+        requested = {}
+        for location in locations:
+            requested.setdefault(self.resolver.normalize(location), location)
+
+        cities = {}
+        for alias in db.query(LocationAliasDB).filter(
+                LocationAliasDB.alias.in_(requested),
+                LocationAliasDB.city_id.isnot(None),
+                LocationAliasDB.location.isnot(None)).all():
+            cities[alias.city_id] = (alias.location,
+                                     requested.pop(alias.alias))
+
+        refreshed, failures = {}, {}
+        for alias, location in requested.items():
+            detail = self.not_found_cache.get(alias)
+            if detail is not None:
+                failures[location] = detail
+                continue
+            try:
+                weather_data = await self.flights.do(
+                    alias, lambda: self.refresh_weather_data(db, location)
+                )
+            except HTTPException as e:
+                failures[location] = e.detail
+                continue
+            refreshed[weather_data["location"]] = weather_data
+
+        await self.refresh_groups(db, cities, refreshed, failures)
+        return refreshed, failures
+
+    async def refresh_groups(self, db: Session, cities: dict,
+                             refreshed: dict, failures: dict):
+        """
+        Refresh locations with known city id by groups, up to group size
+         cities per request. Locations of failed groups are added
+         to failures.
+        :param db: db session
+        :param cities: location key and requested location by city id
+        :param refreshed: weather data by location key, updated
+        :param failures: errors by location, updated
+        :return: nothing
+        """
+        city_ids = list(cities)
+        size = settings.openweather_group_size
+        groups = [city_ids[i:i + size] for i in range(0, len(city_ids), size)]
+        responses = await asyncio.gather(*[
+            self.request_openweather("/group", {
+                "id": ",".join(map(str, group))
+            }) for group in groups
+        ], return_exceptions=True)
+
+        snapshots = []
+        for group, response in zip(groups, responses):
+            if isinstance(response, Exception):
+                detail = getattr(response, "detail", str(response))
+                failures.update((cities[city_id][1], detail)
+                                for city_id in group)
+                continue
+            snapshots += self.parse_group(response, cities, failures)
+        try:
+            self.store_weather_data(db, snapshots)
+        except Exception as e:
+            db.rollback()
+            failures.update((location, str(e))
+                            for _key, location in cities.values())
+            return
+        refreshed.update((i["location"], i) for i in snapshots)
+
+    def parse_group(self, response: dict, cities: dict,
+                    failures: dict) -> list:
+        """
+        Convert items of OpenWeather group response to weather data.
+         Items are converted one by one, so that an item with missing
+         fields fails only its own location.
+        :param response: OpenWeather group response
+        :param cities: location key and requested location by city id
+        :param failures: errors by location, updated
+        :return: weather data of converted items
+        """
+        snapshots = []
+        for item in response.get("list", []):
+            if item.get("id") not in cities:
+                continue
+            key, location = cities[item["id"]]
+            try:
+                snapshots.append(self.parse_weather_data(item, key))
+            except (KeyError, IndexError, TypeError) as e:
+                failures[location] = f"Invalid weather data: {e!r}"
+        return snapshots
+
+    async def request_openweather(self, path: str, params: dict) -> dict:
+        """
+        Make request to OpenWeather.
+        :param path: path of endpoint
+        :param params: query parameters without api key and units
+        :return: json response
+        """
+        if not self.breaker.allow():
+            raise HTTPException(status_code=503,
+                                detail="Weather API is unavailable")
+        try:
+            response = await self.get_client().get(
+                path,
+                params={**params, "appid": self.api_key, "units": "metric"}
+            )
+        except httpx.HTTPError as e:
+            self.breaker.record_failure()
+            raise HTTPException(status_code=502,
+                                detail=f"Weather API error: {str(e)}")
+
+        if response.status_code >= 500 or response.status_code == 429:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        if response.status_code == 404:
+            raise HTTPException(status_code=404,
+                                detail="Location not found")
+        try:
+            response.raise_for_status()
+        except httpx.HTTPError as e:
             raise HTTPException(status_code=502,
                                 detail=f"Weather API error: {str(e)}")
+        return response.json()
+
+    def store_weather_data(self, db: Session, snapshots: list[dict]):
+        """
+        Store snapshots, add them to rollups and to alert outbox
+         in one transaction, cache them in memory and wake alert workers.
+        :param db: db session
+        :param snapshots: weather data
+        :return: nothing
+        """
+        rows = [
+            WeatherCacheDB(
+                location=weather_data["location"],
+                data=weather_data,
+                timestamp=weather_data["timestamp"]
+            ) for weather_data in snapshots
+        ]
+        db.add_all(rows)
+        db.flush()
+        self.service.enqueue(db, rows)
+        HistoryService.add_to_rollups(db, snapshots)
+        db.commit()
+        for weather_data in snapshots:
+            self.memory_cache.set(weather_data["location"],
+                                  (weather_data, weather_data["timestamp"]))
+        self.service.wake([row.location for row in rows])
+
+    @staticmethod
+    def parse_weather_data(data: dict, location: str) -> dict:
+        """
+        Convert OpenWeather response to weather data.
+        :param data: OpenWeather response
+        :param location: location
+        :return: weather data
+        """
+        coord = data.get('coord', {})
+        weather = (data.get('weather') or [{}])[0]
+        return {
+            "lat": coord.get('lat'),
+            "lon": coord.get('lon'),
+            "location": location,
+            "main_weather": weather.get('main'),
+            "icon": weather.get('icon'),
+            "description": weather.get('description'),
+            "temperature": data['main']['temp'],
+            "temperature_feels_like": data['main'].get('feels_like'),
+            "temperature_min": data['main'].get('temp_min'),
+            "temperature_max": data['main'].get('temp_max'),
+            "pressure": data['main']['pressure'],
+            "humidity": data['main']['humidity'],
+            "visibility": data.get('visibility'),
+            "wind_speed": data['wind']['speed'],
+            "wind_deg": data['wind'].get('deg'),
+            "sunrise": data.get('sys', {}).get('sunrise'),
+            "sunset": data.get('sys', {}).get('sunset'),
+            "timestamp": datetime.now(timezone.utc)
+        }
@@ -0,0 +1,31 @@
+import sqlite3
+
+from sqlalchemy import create_engine
+
+from core.database import enable_incremental_vacuum
+
+
+def auto_vacuum(path):
+    connection = sqlite3.connect(path)
+    mode = connection.execute("PRAGMA auto_vacuum").fetchone()[0]
+    connection.close()
+    return mode
+
+
+def test_enable_incremental_vacuum_when_locked(monkeypatch, tmp_path):
+    """Test that locked database doesn't stop startup."""
+    path = tmp_path / "weather.db"
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("CREATE TABLE t (id INTEGER)")
+    monkeypatch.setattr("core.database.engine", create_engine(
+        f"sqlite:///{path}", connect_args={"timeout": 0.1}
+    ))
+
+    other.execute("BEGIN EXCLUSIVE")
+    enable_incremental_vacuum()
+    other.execute("COMMIT")
+    other.close()
+    assert auto_vacuum(path) == 0
+
+    enable_incremental_vacuum()
+    assert auto_vacuum(path) == 2
@@ -0,0 +1,32 @@
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from models.models import WeatherCacheDB
+from core.initial_data import init_weather_columns
+from tests.main import SessionLocalTest
+from tests.main import test_db as _  # noqa: F401
+from tests.routers.weather.main import make_snapshot
+
+
+def test_init_weather_columns(monkeypatch, _):  # noqa: F811
+    """Test moving weather data stored as JSON to typed columns."""
+    monkeypatch.setattr("core.initial_data.SessionLocal", SessionLocalTest)
+    timestamp = datetime(2025, 5, 6, 12, 0)
+    db = SessionLocalTest()
+    db.execute(insert(WeatherCacheDB), [
+        {"location": "moscow", "timestamp": timestamp,
+         "data": make_snapshot("Moscow", float(i), timestamp.isoformat())}
+        for i in range(5)
+    ] + [{"location": "moscow", "timestamp": timestamp, "data": {}}])
+    db.commit()
+
+    init_weather_columns(batch_size=2)
+
+    rows = db.query(WeatherCacheDB).order_by(WeatherCacheDB.id).all()
+    assert [row.temperature for row in rows] == [0.0, 1.0, 2.0, 3.0, 4.0,
+                                                 None]
+    assert all(row.data is None for row in rows)
+    assert rows[0].sunrise == datetime(2025, 5, 6, 4, 35, 54)
+    assert rows[0].to_dict()["humidity"] == 78
+    db.close()
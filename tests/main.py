@@ -2,6 +2,10 @@ import pytest
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from core.database import Base
+from services.alert_index import alert_index
+from services.alert_state import alert_states
+from services.archive_service import archive_service
+from services.location_service import location_resolver
 
 engine_test = create_engine(
     "sqlite:///./data/test.db", connect_args={"check_same_thread": False}
@@ -20,7 +24,11 @@ def override_get_db():
 
 
 @pytest.fixture()
-def test_db():
+def test_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive_service, "path", tmp_path / "archive")
     Base.metadata.create_all(bind=engine_test)
     yield
     Base.metadata.drop_all(bind=engine_test)
+    location_resolver.clear()
+    alert_index.clear()
+    alert_states.clear()
@@ -1,4 +1,4 @@
-def mocked_weather_request(*args):
+async def mocked_weather_request(_client, url, params=None, **_kwargs):
     class MockResponse:
         def __init__(self, json_data, status_code):
             self.json_data = json_data
@@ -10,9 +10,7 @@ def mocked_weather_request(*args):
         def json(self):
             return self.json_data
 
-    if args[0].startswith(
-        "http://api.openweathermap.org/" "data/2.5/weather?q=Moscow"
-    ):
+    if url == "/weather" and params["q"] == "Moscow":
         weather_data = {
             "coord": {
                 "lat": 55.7522,
@@ -45,4 +43,5 @@ def mocked_weather_request(*args):
         }
         return MockResponse(weather_data, 200)
     else:
-        return MockResponse(None, 404)
+        return MockResponse({"cod": "404", "message": "city not found"},
+                            404)
@@ -1,7 +1,10 @@
+from datetime import datetime, timedelta
+
 from core.database import get_db
+from models.models import NotificationDB, UserDB
 from src.main import app
 from fastapi.testclient import TestClient
-from tests.main import override_get_db
+from tests.main import SessionLocalTest, override_get_db
 from tests.main import test_db as _  # noqa: F401
 from tests.routers.alerts.main import mocked_weather_request
 import time
@@ -26,7 +29,7 @@ def register_and_login_user(_):  # noqa: F811
 
 def test_get_notifications_not_authenticated(monkeypatch, _):  # noqa: F811
     """Test getting notifications when not authenticated."""
-    monkeypatch.setattr("requests.get", mocked_weather_request)
+    monkeypatch.setattr("httpx.AsyncClient.get", mocked_weather_request)
     response = client.get("/alerts/notifications")
     assert response.status_code == 403
     assert response.json()["detail"] == "Not authenticated"
@@ -35,7 +38,7 @@ def test_get_notifications_not_authenticated(monkeypatch, _):  # noqa: F811
 def test_get_empty_notifications(monkeypatch, _):  # noqa: F811
     """Test getting empty list of notifications."""
     token = register_and_login_user(client)
-    monkeypatch.setattr("requests.get", mocked_weather_request)
+    monkeypatch.setattr("httpx.AsyncClient.get", mocked_weather_request)
 
     client.post(
         url="/alerts",
@@ -59,3 +62,91 @@ def test_get_empty_notifications(monkeypatch, _):  # noqa: F811
         headers={"Authorization": f"Bearer {token}"}
     )
     assert len(notifications.json()) == 0
+
+
+def add_notifications(count, first_hour=0):
+    """Add notifications of test user an hour apart."""
+    db = SessionLocalTest()
+    user = db.query(UserDB).filter_by(username="test_user").one()
+    start = datetime(2025, 5, 6)
+    db.add_all([
+        NotificationDB(user_id=user.id, location="Moscow",
+                       column_name="temperature", comparator=">=",
+                       number=10, actual_number=12,
+                       timestamp=start + timedelta(hours=i))
+        for i in range(first_hour, first_hour + count)
+    ])
+    db.commit()
+    db.close()
+
+
+def test_get_notifications_pages(_):  # noqa: F811
+    """Test paging notifications from newest to oldest."""
+    token = register_and_login_user(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    add_notifications(5)
+
+    first = client.get("/alerts/notifications?limit=2", headers=headers)
+    assert [n["timestamp"] for n in first.json()] == [
+        "2025-05-06T04:00:00", "2025-05-06T03:00:00"
+    ]
+    seen = first.json()
+    cursor = first.headers["X-Next-Cursor"]
+    while cursor:
+        page = client.get("/alerts/notifications",
+                          params={"limit": 2, "cursor": cursor},
+                          headers=headers)
+        assert "X-Latest-Cursor" not in page.headers
+        seen += page.json()
+        cursor = page.headers.get("X-Next-Cursor")
+    assert [n["id"] for n in seen] == [5, 4, 3, 2, 1]
+
+    response = client.get("/alerts/notifications",
+                          params={"cursor": "invalid"}, headers=headers)
+    assert response.status_code == 400
+
+
+def test_get_notifications_since(_):  # noqa: F811
+    """Test polling only new notifications with since cursor."""
+    token = register_and_login_user(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    add_notifications(2)
+
+    response = client.get("/alerts/notifications", headers=headers)
+    latest = response.headers["X-Latest-Cursor"]
+    response = client.get("/alerts/notifications",
+                          params={"since": latest}, headers=headers)
+    assert response.json() == []
+    assert response.headers["X-Latest-Cursor"] == latest
+
+    add_notifications(3, first_hour=-5)
+    polled = []
+    for _page in range(3):
+        response = client.get("/alerts/notifications",
+                              params={"since": latest, "limit": 2},
+                              headers=headers)
+        polled.append([n["id"] for n in response.json()])
+        latest = response.headers["X-Latest-Cursor"]
+    assert polled == [[3, 4], [5], []]
+
+
+def test_unread_notifications(_):  # noqa: F811
+    """Test counting and marking notifications as read."""
+    token = register_and_login_user(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    add_notifications(3)
+
+    response = client.get("/alerts/notifications/unread", headers=headers)
+    assert response.json() == {"unread": 3}
+
+    page = client.get("/alerts/notifications?limit=2", headers=headers)
+    client.post("/alerts/notifications/read",
+                params={"cursor": page.headers["X-Next-Cursor"]},
+                headers=headers)
+    response = client.get("/alerts/notifications/unread", headers=headers)
+    assert response.json() == {"unread": 1}
+
+    client.post("/alerts/notifications/read", headers=headers)
+    add_notifications(1, first_hour=-1)
+    response = client.get("/alerts/notifications/unread", headers=headers)
+    assert response.json() == {"unread": 1}
@@ -0,0 +1,93 @@
+from datetime import datetime, timezone
+
+from models.models import WeatherCacheDB
+from tests.main import SessionLocalTest
+from tests.routers.alerts.main import mocked_weather_request
+
+cities = {
+    "Moscow": (524901, "RU"),
+    "London": (2643743, "GB"),
+    "Paris": (2988507, "FR"),
+}
+aliases = {
+    "moskva": "moscow",
+}
+# key of the mocked Moscow response, which has coordinates but no id
+moscow_key = "coord:55.75,37.62"
+
+
+class MockResponse:
+    def __init__(self, json_data, status_code):
+        self.json_data = json_data
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.json_data
+
+
+def find_city(query):
+    name = query.split(",")[0].strip().lower()
+    name = aliases.get(name, name)
+    return next((city for city in cities if city.lower() == name), None)
+
+
+async def city_weather(client, name):
+    response = await mocked_weather_request(
+        client, "/weather", {"q": "Moscow"}
+    )
+    city_id, country = cities[name]
+    return {**response.json(), "id": city_id, "name": name,
+            "sys": {**response.json()["sys"], "country": country}}
+
+
+async def mocked_cities_request(client, url, params=None, **_kwargs):
+    if url == "/weather" and find_city(params["q"]) is not None:
+        return MockResponse(
+            await city_weather(client, find_city(params["q"])), 200
+        )
+    if url == "/group":
+        ids = [int(i) for i in params["id"].split(",")]
+        names = [name for name, (i, _c) in cities.items() if i in ids]
+        return MockResponse({
+            "cnt": len(names),
+            "list": [await city_weather(client, name) for name in names]
+        }, 200)
+    return MockResponse({"cod": "404", "message": "city not found"}, 404)
+
+
+def make_snapshot(location, temperature, timestamp):
+    return {
+        "lat": 55.7522,
+        "lon": 37.6156,
+        "location": location,
+        "main_weather": "Clouds",
+        "icon": "04d",
+        "description": "overcast clouds",
+        "temperature": temperature,
+        "temperature_feels_like": temperature,
+        "temperature_min": temperature,
+        "temperature_max": temperature,
+        "pressure": 999.0,
+        "humidity": 78,
+        "visibility": 10000.0,
+        "wind_speed": 3.45,
+        "wind_deg": 154.0,
+        "sunrise": "2025-05-06T04:35:54Z",
+        "sunset": "2025-05-06T20:17:12Z",
+        "timestamp": timestamp,
+    }
+
+
+def add_snapshot(location, temperature, age):
+    timestamp = datetime.now(timezone.utc) - age
+    db = SessionLocalTest()
+    db.add(WeatherCacheDB(
+        location=location,
+        data=make_snapshot(location, temperature, timestamp),
+        timestamp=timestamp
+    ))
+    db.commit()
+    db.close()
@@ -0,0 +1,74 @@
+import csv
+import io
+import json
+from datetime import timedelta
+
+import pytest
+
+from core.database import get_db
+from src.main import app
+from fastapi.testclient import TestClient
+from routers.weather import weather_service
+from tests.main import override_get_db, SessionLocalTest
+from tests.main import test_db as _  # noqa: F401
+from tests.routers.alerts.main import mocked_weather_request
+from tests.routers.weather.main import add_snapshot, moscow_key
+from tests.routers.weather.test_get_weather_history import (
+    register_and_login_user
+)
+
+app.dependency_overrides[get_db] = override_get_db
+client = TestClient(app)
+
+
+@pytest.fixture()
+def mocked_upstream(monkeypatch):
+    weather_service.memory_cache.clear()
+    monkeypatch.setattr("httpx.AsyncClient.get", mocked_weather_request)
+    monkeypatch.setattr(weather_service, "session_factory",
+                        SessionLocalTest)
+    yield
+    weather_service.memory_cache.clear()
+
+
+def test_export_ndjson(mocked_upstream, _):  # noqa: F811
+    """Test exporting history as NDJSON."""
+    token = register_and_login_user(client)
+    for hours in (5, 4, 3):
+        add_snapshot("moscow", float(hours), timedelta(hours=hours))
+
+    response = client.get(
+        "/weather/Moscow/export",
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["temperature"] for row in rows] == [5, 4, 3, 12.79]
+    assert {row["location"] for row in rows} == {moscow_key}
+
+
+def test_export_csv(mocked_upstream, _):  # noqa: F811
+    """Test exporting history as CSV."""
+    token = register_and_login_user(client)
+    for hours in (5, 4, 3):
+        add_snapshot("moscow", float(hours), timedelta(hours=hours))
+
+    response = client.get(
+        "/weather/Moscow/export", params={"format": "csv"},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [float(row["temperature"]) for row in rows] == [5, 4, 3, 12.79]
+
+
+def test_export_invalid_format(mocked_upstream, _):  # noqa: F811
+    """Test exporting history in unknown format."""
+    token = register_and_login_user(client)
+    response = client.get(
+        "/weather/Moscow/export", params={"format": "xml"},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 422
@@ -0,0 +1,301 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+
+from core.database import get_db
+from src.main import app
+from fastapi.testclient import TestClient
+from models.models import WeatherAlertDB, WeatherCacheDB
+from routers.weather import weather_service
+from services.circuit_breaker import CircuitBreaker
+from tests.main import override_get_db, SessionLocalTest
+from tests.main import test_db as _  # noqa: F401
+from tests.routers.alerts.main import mocked_weather_request
+from tests.routers.weather.main import (add_snapshot, make_snapshot,
+                                        mocked_cities_request, moscow_key)
+
+app.dependency_overrides[get_db] = override_get_db
+client = TestClient(app)
+
+
+@pytest.fixture()
+def upstream_calls(monkeypatch):
+    calls = []
+
+    async def counting_weather_request(client, url, params=None, **kwargs):
+        calls.append(params["q"])
+        return await mocked_weather_request(client, url, params)
+
+    weather_service.memory_cache.clear()
+    weather_service.not_found_cache.clear()
+    monkeypatch.setattr("httpx.AsyncClient.get", counting_weather_request)
+    monkeypatch.setattr(weather_service, "session_factory",
+                        SessionLocalTest)
+    monkeypatch.setattr(weather_service, "breaker", CircuitBreaker(2, 30))
+    yield calls
+    weather_service.memory_cache.clear()
+    weather_service.not_found_cache.clear()
+
+
+def register_and_login_user(_):  # noqa: F811
+    user_data = {
+        "username": "test_user",
+        "email": "test_user@test.example",
+        "password": "testpassword",
+    }
+    client.post("/auth/register", json=user_data)
+    user = client.post(
+        "/auth/login",
+        json={"username": "test_user", "password": "testpassword"},
+    )
+    return user.json()["access_token"]
+
+
+def test_get_weather(upstream_calls, _):  # noqa: F811
+    """Test getting weather for location."""
+    token = register_and_login_user(client)
+    response = client.get(
+        "/weather/Moscow", headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200
+    assert response.json()["temperature"] == 12.79
+    assert response.json()["humidity"] == 78
+    assert len(upstream_calls) == 1
+
+
+def test_get_weather_served_from_memory(upstream_calls, _):  # noqa: F811
+    """Test that repeated requests are served from in-memory cache."""
+    token = register_and_login_user(client)
+    for _i in range(3):
+        response = client.get(
+            "/weather/Moscow", headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 200
+
+    assert len(upstream_calls) == 1
+    stats = weather_service.memory_cache.stats()
+    assert stats["hits"] == 2
+    assert stats["size"] == 1
+
+
+def test_get_weather_not_authenticated(upstream_calls, _):  # noqa: F811
+    """Test getting weather when not authenticated."""
+    response = client.get("/weather/Moscow")
+    assert response.status_code == 403
+    assert response.json()["detail"] == "Not authenticated"
+    assert len(upstream_calls) == 0
+
+
+def test_get_weather_uses_latest_snapshot(upstream_calls, _):  # noqa: F811
+    """Test that the newest snapshot is used when history exists."""
+    token = register_and_login_user(client)
+    now = datetime.now(timezone.utc)
+    db = SessionLocalTest()
+    for minutes, temperature in ((120, 1.0), (5, 2.0), (60, 3.0)):
+        timestamp = now - timedelta(minutes=minutes)
+        db.add(WeatherCacheDB(
+            location="Moscow",
+            data=make_snapshot("Moscow", temperature, timestamp),
+            timestamp=timestamp
+        ))
+    db.commit()
+    db.close()
+
+    response = client.get(
+        "/weather/Moscow", headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200
+    assert response.json()["temperature"] == 2.0
+    assert len(upstream_calls) == 0
+
+
+def test_concurrent_misses_are_coalesced(monkeypatch, _):  # noqa: F811
+    """Test that concurrent cache misses make one upstream request."""
+    calls = []
+
+    async def slow_weather_request(client, url, params=None, **kwargs):
+        calls.append(params["q"])
+        await asyncio.sleep(0.2)
+        return await mocked_weather_request(client, url, params)
+
+    weather_service.memory_cache.clear()
+    monkeypatch.setattr("httpx.AsyncClient.get", slow_weather_request)
+    db = SessionLocalTest()
+
+    async def get_concurrently():
+        return await asyncio.gather(*[
+            weather_service.get_weather_data(db, "Moscow")
+            for _i in range(5)
+        ])
+
+    results = asyncio.run(get_concurrently())
+    rows = db.query(WeatherCacheDB).filter_by(location=moscow_key).count()
+    db.close()
+    weather_service.memory_cache.clear()
+
+    assert len(calls) == 1
+    assert len(results) == 5
+    assert rows == 1
+
+
+def test_get_weather_stale(upstream_calls, _):  # noqa: F811
+    """Test that snapshot past soft ttl is served and marked as stale."""
+    token = register_and_login_user(client)
+    add_snapshot("Moscow", 5.0, timedelta(minutes=40))
+
+    response = client.get(
+        "/weather/Moscow", headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200
+    assert response.headers["X-Weather-Stale"] == "true"
+    assert response.json()["temperature"] == 5.0
+
+
+def test_get_weather_past_stale_ttl(upstream_calls, _):  # noqa: F811
+    """Test that snapshot past stale ttl is not served."""
+    token = register_and_login_user(client)
+    add_snapshot("Moscow", 5.0, timedelta(hours=3))
+
+    response = client.get(
+        "/weather/Moscow", headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200
+    assert "X-Weather-Stale" not in response.headers
+    assert response.json()["temperature"] == 12.79
+    assert len(upstream_calls) == 1
+
+
+def test_stale_snapshot_refreshed_in_background(
+        upstream_calls, _):  # noqa: F811
+    """Test that serving stale snapshot triggers one background refresh."""
+    add_snapshot("Moscow", 5.0, timedelta(minutes=40))
+    db = SessionLocalTest()
+
+    async def get_twice():
+        first = await weather_service.get_weather_snapshot(db, "Moscow")
+        second = await weather_service.get_weather_snapshot(db, "Moscow")
+        await asyncio.gather(*weather_service.background_tasks.values())
+        third = await weather_service.get_weather_snapshot(db, "Moscow")
+        return first, second, third
+
+    first, second, third = asyncio.run(get_twice())
+    rows = db.query(WeatherCacheDB).count()
+    db.close()
+
+    assert first.stale and second.stale
+    assert first.data["temperature"] == 5.0
+    assert not third.stale
+    assert third.data["temperature"] == 12.79
+    assert len(upstream_calls) == 1
+    assert rows == 2
+
+
+def test_get_weather_not_found_is_cached(upstream_calls, _):  # noqa: F811
+    """Test that unknown location is not requested again for a while."""
+    token = register_and_login_user(client)
+    for _i in range(3):
+        response = client.get(
+            "/weather/Atlantis", headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 404
+        assert response.json()["detail"] == "Location not found"
+
+    assert upstream_calls == ["Atlantis"]
+
+
+def test_get_weather_circuit_breaker(
+        monkeypatch, upstream_calls, _):  # noqa: F811
+    """Test that requests fail fast after consecutive upstream errors."""
+    async def failing_request(client, url, params=None, **kwargs):
+        upstream_calls.append(params["q"])
+        raise httpx.ConnectError("Connection refused")
+
+    monkeypatch.setattr("httpx.AsyncClient.get", failing_request)
+    token = register_and_login_user(client)
+    statuses = [
+        client.get(
+            "/weather/Moscow", headers={"Authorization": f"Bearer {token}"}
+        ).status_code for _i in range(3)
+    ]
+
+    assert statuses == [502, 502, 503]
+    assert len(upstream_calls) == 2
+
+
+def test_get_weather_upstream_down_serves_stale(
+        monkeypatch, upstream_calls, _):  # noqa: F811
+    """Test that old snapshot is served when upstream is unavailable."""
+    async def failing_request(client, url, params=None, **kwargs):
+        raise httpx.ConnectError("Connection refused")
+
+    monkeypatch.setattr("httpx.AsyncClient.get", failing_request)
+    token = register_and_login_user(client)
+    add_snapshot("Moscow", 5.0, timedelta(hours=3))
+
+    response = client.get(
+        "/weather/Moscow", headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200
+    assert response.headers["X-Weather-Stale"] == "true"
+    assert response.json()["temperature"] == 5.0
+
+
+def test_get_weather_location_aliases(
+        monkeypatch, upstream_calls, _):  # noqa: F811
+    """Test that spellings of one place share one cache entry."""
+    async def counting_request(client, url, params=None, **kwargs):
+        upstream_calls.append(params["q"])
+        return await mocked_cities_request(client, url, params)
+
+    monkeypatch.setattr("httpx.AsyncClient.get", counting_request)
+    token = register_and_login_user(client)
+    client.post(
+        url="/alerts",
+        headers={"Authorization": f"Bearer {token}"},
+        json={"location": " moscow ", "column_name": "temperature",
+              "comparator": ">=", "number": 20},
+    )
+
+    for location in ("Moscow", " moscow ", "MOSCOW , ru", "Moskva",
+                     "moskva"):
+        response = client.get(
+            f"/weather/{location}",
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 200
+        assert response.json()["location"] == "city:524901"
+
+    db = SessionLocalTest()
+    locations = {row.location for row in db.query(WeatherCacheDB)}
+    alert = db.query(WeatherAlertDB).first()
+    db.close()
+
+    assert upstream_calls == ["Moscow", "Moskva"]
+    assert locations == {"city:524901"}
+    assert alert.location == " moscow "
+    assert alert.location_key == "city:524901"
+
+
+def test_get_weather_not_modified(upstream_calls, _):  # noqa: F811
+    """Test revalidating weather with entity tag."""
+    token = register_and_login_user(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.get("/weather/Moscow", headers=headers)
+    etag = response.headers["ETag"]
+    max_age = int(response.headers["Cache-Control"].split("=")[1])
+    assert 0 < max_age <= 30 * 60
+
+    response = client.get(
+        "/weather/Moscow", headers={**headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+    response = client.get(
+        "/weather/Moscow", headers={**headers, "If-None-Match": '"other"'}
+    )
+    assert response.status_code == 200
+    assert response.json()["temperature"] == 12.79
@@ -0,0 +1,225 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from core.database import get_db
+from src.main import app
+from fastapi.testclient import TestClient
+from models.models import WeatherRollupDB
+from routers.weather import weather_service
+from services.history_service import HistoryService
+from tests.main import override_get_db, SessionLocalTest
+from tests.main import test_db as _  # noqa: F401
+from tests.routers.alerts.main import mocked_weather_request
+from tests.routers.weather.main import (add_snapshot, make_snapshot,
+                                        moscow_key)
+
+app.dependency_overrides[get_db] = override_get_db
+client = TestClient(app)
+
+
+@pytest.fixture()
+def mocked_upstream(monkeypatch):
+    weather_service.memory_cache.clear()
+    monkeypatch.setattr("httpx.AsyncClient.get", mocked_weather_request)
+    yield
+    weather_service.memory_cache.clear()
+
+
+def register_and_login_user(_):  # noqa: F811
+    user_data = {
+        "username": "test_user",
+        "email": "test_user@test.example",
+        "password": "testpassword",
+    }
+    client.post("/auth/register", json=user_data)
+    user = client.post(
+        "/auth/login",
+        json={"username": "test_user", "password": "testpassword"},
+    )
+    return user.json()["access_token"]
+
+
+def test_get_weather_history(mocked_upstream, _):  # noqa: F811
+    """Test getting history of weather for location."""
+    token = register_and_login_user(client)
+    for hours in (5, 4, 3):
+        add_snapshot("moscow", float(hours), timedelta(hours=hours))
+
+    response = client.get(
+        "/weather/Moscow/history",
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200
+    assert len(response.json()) == 4
+
+
+def test_get_weather_history_not_modified(mocked_upstream, _):  # noqa: F811
+    """Test revalidating history with entity tag."""
+    token = register_and_login_user(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.get("/weather/Moscow/history", headers=headers)
+    etag = response.headers["ETag"]
+
+    response = client.get(
+        "/weather/Moscow/history",
+        headers={**headers, "If-None-Match": f"W/{etag}"}
+    )
+    assert response.status_code == 304
+
+    add_snapshot(moscow_key, 1.0, timedelta(minutes=1))
+    response = client.get(
+        "/weather/Moscow/history",
+        headers={**headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert len(response.json()) == 2
+
+
+def test_get_weather_history_rollups_not_modified(
+        mocked_upstream, _):  # noqa: F811
+    """Test that entity tag of rollups changes with their counts."""
+    token = register_and_login_user(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    params = {"resolution": "day"}
+    response = client.get("/weather/Moscow/history", params=params,
+                          headers=headers)
+    etag = response.headers["ETag"]
+    assert len(response.json()) == 1
+
+    db = SessionLocalTest()
+    HistoryService.add_to_rollups(db, [make_snapshot(
+        moscow_key, 1.0, datetime.now(timezone.utc).replace(tzinfo=None)
+    )])
+    db.commit()
+    db.close()
+    response = client.get("/weather/Moscow/history", params=params,
+                          headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_get_weather_history_pages(mocked_upstream, _):  # noqa: F811
+    """Test reading history page by page with cursor."""
+    token = register_and_login_user(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    for hours in range(12, 2, -1):
+        add_snapshot("moscow", float(hours), timedelta(hours=hours))
+
+    temperatures = []
+    cursor = None
+    pages = 0
+    while True:
+        params = {"limit": 4}
+        if cursor is not None:
+            params["cursor"] = cursor
+        response = client.get("/weather/Moscow/history", params=params,
+                              headers=headers)
+        assert response.status_code == 200
+        assert len(response.json()) <= 4
+        temperatures += [i["temperature"] for i in response.json()]
+        pages += 1
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+
+    assert pages == 3
+    assert temperatures == [float(h) for h in range(12, 2, -1)] + [12.79]
+
+
+def test_get_weather_history_time_range(mocked_upstream, _):  # noqa: F811
+    """Test filtering history by time range."""
+    token = register_and_login_user(client)
+    for hours in range(12, 2, -1):
+        add_snapshot("moscow", float(hours), timedelta(hours=hours))
+
+    now = datetime.now(timezone.utc)
+    response = client.get(
+        "/weather/Moscow/history",
+        params={"from": (now - timedelta(hours=8, minutes=30)).isoformat(),
+                "to": (now - timedelta(hours=4, minutes=30)).isoformat()},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200
+    assert [i["temperature"] for i in response.json()] == [8, 7, 6, 5]
+
+
+def test_get_weather_history_invalid_cursor(mocked_upstream, _):  # noqa: F811
+    """Test getting history with invalid cursor."""
+    token = register_and_login_user(client)
+    response = client.get(
+        "/weather/Moscow/history", params={"cursor": "not-a-cursor"},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+def store_snapshots(temperatures_by_age):
+    now = datetime.now(timezone.utc).replace(minute=30)
+    db = SessionLocalTest()
+    weather_service.store_weather_data(db, [
+        make_snapshot("moscow", temperature, now - age)
+        for age, temperature in temperatures_by_age
+    ])
+    db.close()
+
+
+def test_get_weather_history_hourly(mocked_upstream, _):  # noqa: F811
+    """Test getting hourly aggregates of history."""
+    token = register_and_login_user(client)
+    store_snapshots([
+        (timedelta(hours=4, minutes=20), 10.0),
+        (timedelta(hours=4), 14.0),
+        (timedelta(hours=4, minutes=-20), 12.0),
+        (timedelta(hours=3), 20.0),
+    ])
+
+    response = client.get(
+        "/weather/Moscow/history", params={"resolution": "hour"},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200
+    rollups = response.json()
+    assert [rollup["count"] for rollup in rollups[:2]] == [3, 1]
+    assert rollups[0]["resolution"] == "hour"
+    assert rollups[0]["temperature_min"] == 10.0
+    assert rollups[0]["temperature_max"] == 14.0
+    assert rollups[0]["temperature_mean"] == 12.0
+    assert rollups[0]["humidity_mean"] == 78
+    assert rollups[1]["temperature_mean"] == 20.0
+
+
+def test_rebuild_rollups(mocked_upstream, _):  # noqa: F811
+    """Test that rebuilt rollups match incrementally maintained ones."""
+    store_snapshots([(timedelta(hours=h), float(h)) for h in range(60)])
+    store_snapshots([(timedelta(hours=h), -float(h)) for h in range(30)])
+    db = SessionLocalTest()
+    incremental = sorted(
+        (r.resolution, r.bucket, r.count, r.temperature_min,
+         r.temperature_max, r.temperature_sum)
+        for r in db.query(WeatherRollupDB)
+    )
+    HistoryService.rebuild_rollups(db, batch_size=7)
+    db.commit()
+    rebuilt = sorted(
+        (r.resolution, r.bucket, r.count, r.temperature_min,
+         r.temperature_max, r.temperature_sum)
+        for r in db.query(WeatherRollupDB)
+    )
+    db.close()
+
+    assert len([r for r in rebuilt if r[0] == "day"]) in (3, 4)
+    assert rebuilt == incremental
+
+
+def test_get_weather_history_invalid_resolution(
+        mocked_upstream, _):  # noqa: F811
+    """Test getting history with unknown resolution."""
+    token = register_and_login_user(client)
+    response = client.get(
+        "/weather/Moscow/history", params={"resolution": "week"},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 422
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from core.database import get_db
+from src.main import app
+from fastapi.testclient import TestClient
+from routers.weather import weather_service
+from tests.main import override_get_db
+from tests.main import test_db as _  # noqa: F401
+from tests.routers.alerts.main import mocked_weather_request
+from tests.routers.weather.main import add_snapshot
+from tests.routers.weather.test_get_weather_history import (
+    register_and_login_user
+)
+
+app.dependency_overrides[get_db] = override_get_db
+client = TestClient(app)
+
+
+@pytest.fixture()
+def mocked_upstream(monkeypatch):
+    weather_service.memory_cache.clear()
+    monkeypatch.setattr("httpx.AsyncClient.get", mocked_weather_request)
+    yield
+    weather_service.memory_cache.clear()
+
+
+def test_get_weather_stats(mocked_upstream, _):  # noqa: F811
+    """Test getting statistics of temperature over time range."""
+    token = register_and_login_user(client)
+    for hours in range(8, 2, -1):
+        add_snapshot("moscow", float(hours), timedelta(hours=hours))
+
+    now = datetime.now(timezone.utc)
+    response = client.get(
+        "/weather/Moscow/stats",
+        params={"from": (now - timedelta(hours=7, minutes=30)).isoformat(),
+                "to": (now - timedelta(hours=3, minutes=30)).isoformat(),
+                "fields": ["temperature"], "percentiles": [50, 100]},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200
+    assert response.json()["count"] == 4
+    stats = response.json()["stats"]["temperature"]
+    assert (stats["min"], stats["max"], stats["mean"]) == (4, 7, 5.5)
+    assert stats["std"] == pytest.approx(1.118, abs=1e-3)
+    assert stats["percentiles"] == {"50.0": 5.5, "100.0": 7}
+
+
+def test_get_weather_stats_empty_range(mocked_upstream, _):  # noqa: F811
+    """Test getting statistics of time range without snapshots."""
+    token = register_and_login_user(client)
+    response = client.get(
+        "/weather/Moscow/stats",
+        params={"to": "2000-01-01T00:00:00+00:00"},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200
+    assert response.json()["count"] == 0
+    assert response.json()["stats"]["pressure"]["mean"] is None
+
+
+def test_get_weather_stats_unknown_field(mocked_upstream, _):  # noqa: F811
+    """Test getting statistics of field that isn't numeric."""
+    token = register_and_login_user(client)
+    response = client.get(
+        "/weather/Moscow/stats", params={"fields": ["icon"]},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 400
@@ -0,0 +1,159 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+from core.config import settings
+from core.database import get_db
+from src.main import app
+from fastapi.testclient import TestClient
+from models.models import (NotificationDB, WeatherAlertDB, WeatherCacheDB,
+                           WeatherRollupDB)
+from tests.main import override_get_db, SessionLocalTest
+from tests.main import test_db as _  # noqa: F401
+from tests.routers.weather.test_get_weather_history import (
+    register_and_login_user
+)
+
+app.dependency_overrides[get_db] = override_get_db
+client = TestClient(app)
+
+START = datetime(2020, 1, 1)
+
+
+def register_and_login_admin():
+    user_data = {
+        "username": settings.admin_username,
+        "email": "admin@test.example",
+        "password": "adminpassword",
+    }
+    client.post("/auth/register", json=user_data)
+    user = client.post(
+        "/auth/login",
+        json={"username": settings.admin_username,
+              "password": "adminpassword"},
+    )
+    return user.json()["access_token"]
+
+
+def observation(hours, temperature):
+    return {
+        "location": "Moscow",
+        "timestamp": (START + timedelta(hours=hours)).isoformat(),
+        "temperature": temperature,
+        "pressure": 1000,
+        "humidity": 50,
+        "wind_speed": 3,
+    }
+
+
+def test_import_ndjson(_):  # noqa: F811
+    """Test importing observations with invalid lines."""
+    token = register_and_login_admin()
+    lines = [json.dumps(observation(hours, 1.0)) for hours in range(3)]
+    lines += ["not json", json.dumps({"location": "Moscow"})]
+
+    response = client.post(
+        "/weather/import",
+        files={"file": ("history.ndjson", "\n".join(lines))},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["imported"], result["rejected"]) == (3, 2)
+    assert [error["line"] for error in result["errors"]] == [4, 5]
+
+    db = SessionLocalTest()
+    assert db.query(WeatherCacheDB).filter_by(location="moscow").count() == 3
+    assert db.query(WeatherRollupDB).filter_by(resolution="day").one()\
+        .count == 3
+    db.close()
+
+
+def test_import_rejects_future_and_non_admin(_):  # noqa: F811
+    """Test that only admin imports and only past observations."""
+    future = observation(0, 99.0)
+    future["timestamp"] = "2099-01-01T00:00:00"
+    content = json.dumps(future)
+
+    token = register_and_login_user(client)
+    response = client.post(
+        "/weather/import", files={"file": ("history.ndjson", content)},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 403
+
+    token = register_and_login_admin()
+    response = client.post(
+        "/weather/import", files={"file": ("history.ndjson", content)},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert (response.json()["imported"], response.json()["rejected"]) \
+        == (0, 1)
+    assert "future" in response.json()["errors"][0]["error"]
+
+
+def test_read_imported_observation(_):  # noqa: F811
+    """Test reading observation without optional fields through API."""
+    token = register_and_login_admin()
+    headers = {"Authorization": f"Bearer {token}"}
+    imported = observation(0, 1.0)
+    imported["timestamp"] = datetime.now(timezone.utc).isoformat()
+    client.post("/weather/import",
+                files={"file": ("history.ndjson", json.dumps(imported))},
+                headers=headers)
+
+    response = client.get("/weather/Moscow", headers=headers)
+    assert response.status_code == 200
+    assert (response.json()["temperature"],
+            response.json()["main_weather"]) == (1.0, None)
+
+    response = client.get("/weather/Moscow/history", headers=headers)
+    assert response.status_code == 200
+    assert [row["sunrise"] for row in response.json()] == [None]
+
+
+def test_import_csv(_):  # noqa: F811
+    """Test importing observations from CSV."""
+    token = register_and_login_admin()
+    header = "location,timestamp,temperature,pressure,humidity,wind_speed," \
+             "wind_deg\n"
+    rows = "London,2020-01-01T00:00:00,5.5,1010,80,2,\n" \
+           "London,2020-01-01T01:00:00,6.5,1011,81,3,90\n"
+
+    response = client.post(
+        "/weather/import", params={"format": "csv"},
+        files={"file": ("history.csv", header + rows)},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200
+    assert response.json()["imported"] == 2
+
+    db = SessionLocalTest()
+    rows = db.query(WeatherCacheDB).order_by(WeatherCacheDB.timestamp).all()
+    assert [row.temperature for row in rows] == [5.5, 6.5]
+    assert [row.wind_deg for row in rows] == [None, 90]
+    db.close()
+
+
+def test_import_replay_alerts(_):  # noqa: F811
+    """Test evaluating alerts for imported observations."""
+    token = register_and_login_admin()
+    db = SessionLocalTest()
+    db.add(WeatherAlertDB(user_id=1, location="Moscow",
+                          location_key="moscow", column_name="temperature",
+                          comparator=">", number=10))
+    db.commit()
+    lines = [json.dumps(observation(hours, temperature))
+             for hours, temperature in ((0, 5.0), (1, 15.0), (2, 20.0),
+                                        (3, 5.0), (4, 20.0))]
+
+    response = client.post(
+        "/weather/import", params={"replay_alerts": True},
+        files={"file": ("history.ndjson", "\n".join(lines))},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200
+    timestamps = [row.timestamp for row in db.query(NotificationDB)
+                  .order_by(NotificationDB.timestamp)]
+    assert timestamps == [START + timedelta(hours=1),
+                          START + timedelta(hours=4)]
+    db.close()
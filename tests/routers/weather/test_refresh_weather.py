@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+
+from core.config import settings
+from models.models import LocationAliasDB, WeatherCacheDB
+from routers.weather import weather_service
+from tests.main import SessionLocalTest
+from tests.main import test_db as _  # noqa: F401
+from tests.routers.weather.main import mocked_cities_request
+
+
+@pytest.fixture()
+def upstream_calls(monkeypatch):
+    calls = []
+
+    async def counting_request(client, url, params=None, **kwargs):
+        calls.append((url, params))
+        return await mocked_cities_request(client, url, params)
+
+    weather_service.memory_cache.clear()
+    monkeypatch.setattr("httpx.AsyncClient.get", counting_request)
+    yield calls
+    weather_service.memory_cache.clear()
+    weather_service.not_found_cache.clear()
+
+
+def test_refresh_many_unknown_locations(upstream_calls, _):  # noqa: F811
+    """Test that locations without city id are fetched one by one."""
+    db = SessionLocalTest()
+    refreshed, failures = asyncio.run(
+        weather_service.refresh_many_weather_data(db, ["Moscow", "London"])
+    )
+    aliases = {a.alias: a.city_id for a in db.query(LocationAliasDB)}
+    db.close()
+
+    assert set(refreshed) == {"city:524901", "city:2643743"}
+    assert failures == {}
+    assert [url for url, _params in upstream_calls] == ["/weather"] * 2
+    assert aliases == {"moscow": 524901, "moscow,ru": 524901,
+                       "city:524901": 524901, "london": 2643743,
+                       "london,gb": 2643743, "city:2643743": 2643743}
+
+
+def test_refresh_many_uses_group_endpoint(
+        monkeypatch, upstream_calls, _):  # noqa: F811
+    """Test that locations with city id are fetched by groups."""
+    monkeypatch.setattr(settings, "openweather_group_size", 2)
+    db = SessionLocalTest()
+    for name, city_id, key in (("moscow", 524901, "city:524901"),
+                               ("london", 2643743, "city:2643743"),
+                               ("paris", 2988507, "city:2988507")):
+        db.add(LocationAliasDB(alias=name, city_id=city_id, location=key))
+    db.commit()
+
+    refreshed, _failures = asyncio.run(
+        weather_service.refresh_many_weather_data(
+            db, ["Moscow", "London", "Paris", " MOSCOW "]
+        )
+    )
+    rows = db.query(WeatherCacheDB).count()
+    db.close()
+
+    assert set(refreshed) == {"city:524901", "city:2643743", "city:2988507"}
+    assert [url for url, _params in upstream_calls] == ["/group"] * 2
+    assert rows == 3
+    assert weather_service.memory_cache.stats()["size"] == 3
+
+
+def test_refresh_many_with_unknown_location(
+        upstream_calls, _):  # noqa: F811
+    """Test that unknown location doesn't stop refresh of the others."""
+    db = SessionLocalTest()
+    for name, city_id, key in (("moscow", 524901, "city:524901"),
+                               ("london", 2643743, "city:2643743")):
+        db.add(LocationAliasDB(alias=name, city_id=city_id, location=key))
+    db.commit()
+
+    for _refresh in range(2):
+        refreshed, failures = asyncio.run(
+            weather_service.refresh_many_weather_data(
+                db, ["Moscow", "London", "Atlantis"]
+            )
+        )
+        assert set(refreshed) == {"city:524901", "city:2643743"}
+        assert failures == {"Atlantis": "Location not found"}
+    rows = db.query(WeatherCacheDB).count()
+    db.close()
+
+    assert rows == 4
+    assert [url for url, _params in upstream_calls] == [
+        "/weather", "/group", "/group"
+    ]
+
+
+def test_refresh_many_with_invalid_item(monkeypatch, _):  # noqa: F811
+    """Test that invalid item of group fails only its own location."""
+    async def partial_request(client, url, params=None, **kwargs):
+        response = await mocked_cities_request(client, url, params)
+        for item in response.json_data["list"]:
+            del item["visibility"]
+            del item["wind"]["deg"]
+            if item["id"] == 2643743:
+                del item["main"]
+        return response
+
+    weather_service.memory_cache.clear()
+    monkeypatch.setattr("httpx.AsyncClient.get", partial_request)
+    db = SessionLocalTest()
+    for name, city_id, key in (("moscow", 524901, "city:524901"),
+                               ("london", 2643743, "city:2643743")):
+        db.add(LocationAliasDB(alias=name, city_id=city_id, location=key))
+    db.commit()
+
+    refreshed, failures = asyncio.run(
+        weather_service.refresh_many_weather_data(db, ["Moscow", "London"])
+    )
+    rows = db.query(WeatherCacheDB).count()
+    db.close()
+    weather_service.memory_cache.clear()
+
+    assert set(refreshed) == {"city:524901"}
+    assert refreshed["city:524901"]["visibility"] is None
+    assert set(failures) == {"London"}
+    assert rows == 1
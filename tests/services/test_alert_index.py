@@ -0,0 +1,115 @@
+from core.config import settings
+from models.models import NotificationDB, WeatherAlertDB
+from services.alert_index import AlertIndex, alert_index
+from services.alert_service import AlertBackgroundService
+from tests.main import SessionLocalTest
+from tests.main import test_db as _  # noqa: F401
+
+
+def add_alert(db, alert_id, column_name, comparator, number):
+    alert = WeatherAlertDB(id=alert_id, user_id=1, location="Moscow",
+                           location_key="moscow", column_name=column_name,
+                           comparator=comparator, number=number)
+    db.add(alert)
+    db.commit()
+    return alert
+
+
+def matched_ids(index, db, **weather_data):
+    return sorted(rule.id for rule, _actual in
+                  index.match(db, {"location": "moscow", **weather_data}))
+
+
+def test_match(_):  # noqa: F811
+    """Test finding alerts triggered by value for every comparator."""
+    db = SessionLocalTest()
+    for alert_id, comparator, number in ((1, ">", 10), (2, ">=", 20),
+                                         (3, "<", 20), (4, "<=", 10),
+                                         (5, ">", 20)):
+        add_alert(db, alert_id, "temperature", comparator, number)
+    add_alert(db, 6, "humidity", ">", 50)
+    index = AlertIndex()
+
+    assert matched_ids(index, db, temperature=10) == [3, 4]
+    assert matched_ids(index, db, temperature=20) == [1, 2]
+    assert matched_ids(index, db, temperature=25, humidity=60) == [1, 2, 5, 6]
+    assert index.match(db, {"location": "london", "temperature": 25}) == []
+    db.close()
+
+
+def test_incremental_updates(_):  # noqa: F811
+    """Test keeping index up to date without reloading it."""
+    db = SessionLocalTest()
+    alert = add_alert(db, 1, "temperature", ">", 10)
+    index = AlertIndex()
+    assert matched_ids(index, db, temperature=15) == [1]
+
+    added = add_alert(db, 2, "temperature", "<", 20)
+    index.add(added)
+    assert matched_ids(index, db, temperature=15) == [1, 2]
+
+    alert.number = 30
+    db.commit()
+    index.add(alert)
+    assert matched_ids(index, db, temperature=15) == [2]
+
+    index.remove(2)
+    assert matched_ids(index, db, temperature=15) == []
+    db.close()
+
+
+def test_changes_of_another_process(monkeypatch, _):  # noqa: F811
+    """Test loading again alerts changed by another process."""
+    monkeypatch.setattr(settings, "alert_cooldown_seconds", 0)
+    db = SessionLocalTest()
+    add_alert(db, 1, "temperature", ">", 10)
+
+    def notified(temperature):
+        AlertBackgroundService.add_notifications(db, [
+            {"location": "moscow", "temperature": temperature}
+        ])
+        db.commit()
+        return [n.number for n in db.query(NotificationDB).filter_by(
+            actual_number=temperature
+        )]
+
+    assert notified(15) == [10]
+    # another process adds alert without updating index of this one
+    add_alert(db, 2, "temperature", ">", 12)
+    AlertIndex.touch(db, ["moscow"])
+    db.commit()
+    assert notified(16) == [12]
+
+    db.query(WeatherAlertDB).filter_by(id=2).delete()
+    AlertIndex.touch(db, ["moscow"])
+    db.commit()
+    assert notified(17) == []
+    assert alert_index.rule(2) is None
+    db.close()
+
+
+def test_versions_of_own_changes(_):  # noqa: F811
+    """Test that changes of this process don't make location stale."""
+    db = SessionLocalTest()
+    add_alert(db, 1, "temperature", ">", 10)
+    index = AlertIndex()
+    assert matched_ids(index, db, temperature=15) == [1]
+
+    added = WeatherAlertDB(id=2, user_id=1, location="Moscow",
+                           location_key="moscow", column_name="temperature",
+                           comparator=">", number=12)
+    db.add(added)
+    versions = index.touch(db, ["moscow"])
+    db.commit()
+    index.add(added, versions)
+    assert versions == {"moscow": 1}
+    assert index.stale(db, ["moscow"]) == []
+
+    # another process changes location before this one
+    index.touch(db, ["moscow"])
+    db.query(WeatherAlertDB).filter_by(id=1).delete()
+    versions = index.touch(db, ["moscow"])
+    db.commit()
+    index.remove(1, versions)
+    assert index.stale(db, ["moscow"]) == ["moscow"]
+    db.close()
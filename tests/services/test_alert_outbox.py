@@ -0,0 +1,42 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from core.config import settings
+from models.models import AlertOutboxDB, NotificationDB, WeatherAlertDB
+from routers.weather import weather_service
+from services.alert_service import AlertWorkerPool
+from tests.main import SessionLocalTest
+from tests.main import test_db as _  # noqa: F401
+from tests.routers.weather.main import make_snapshot
+
+
+def test_outbox_is_resumed(monkeypatch, _):  # noqa: F811
+    """Test evaluating stored snapshots left in outbox by a restart."""
+    db = SessionLocalTest()
+    db.add(WeatherAlertDB(id=1, user_id=1, location="Moscow",
+                          location_key="moscow", column_name="temperature",
+                          comparator=">", number=20))
+    db.commit()
+    now = datetime.now(timezone.utc)
+    weather_service.store_weather_data(db, [
+        make_snapshot(location, temperature, now - timedelta(minutes=age))
+        for location, temperature, age in (("moscow", 25.0, 2),
+                                           ("london", 25.0, 2),
+                                           ("moscow", 30.0, 1))
+    ])
+    weather_service.memory_cache.clear()
+    assert db.query(AlertOutboxDB).count() == 3
+
+    async def restart():
+        pool = AlertWorkerPool(settings.alert_workers + 1, SessionLocalTest)
+        await pool.start()
+        await pool.stop()
+        return pool
+
+    pool = asyncio.run(restart())
+
+    assert db.query(AlertOutboxDB).count() == 0
+    notifications = db.query(NotificationDB).all()
+    assert [n.actual_number for n in notifications] == [30]
+    assert sum(m["processed"] for m in pool.metrics()) == 3
+    db.close()
@@ -0,0 +1,51 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from models.models import NotificationDB, WeatherAlertDB
+from routers.weather import weather_service
+from services.alert_service import AlertBackgroundService, AlertWorkerPool
+from tests.main import SessionLocalTest
+from tests.main import test_db as _  # noqa: F401
+from tests.routers.weather.main import make_snapshot
+
+
+def test_drain_and_process(monkeypatch, _):  # noqa: F811
+    """Test that only the latest weather data of location is checked."""
+    db = SessionLocalTest()
+    for alert_id, location in ((1, "moscow"), (2, "london")):
+        db.add(WeatherAlertDB(id=alert_id, user_id=1, location=location,
+                              location_key=location,
+                              column_name="temperature",
+                              comparator=">", number=20))
+    db.commit()
+    now = datetime.now(timezone.utc)
+
+    async def process():
+        pool = AlertWorkerPool(1, session_factory=SessionLocalTest)
+        monkeypatch.setattr(weather_service, "service", pool)
+        await pool.start()
+        weather_service.store_weather_data(db, [
+            make_snapshot(location, temperature, now - timedelta(minutes=age))
+            for location, temperature, age in (("moscow", 25.0, 2),
+                                               ("london", 25.0, 2),
+                                               ("moscow", 15.0, 1))
+        ])
+        await pool.stop()
+        return pool.workers[0].metrics()
+
+    metrics = asyncio.run(process())
+    weather_service.memory_cache.clear()
+    assert (metrics["processed"], metrics["batches"]) == (3, 1)
+    assert metrics["outbox_depth"] == 0
+    notifications = db.query(NotificationDB).all()
+    assert [n.location for n in notifications] == ["london"]
+    assert notifications[0].actual_number == 25
+    db.close()
+
+
+def test_not_started(_):  # noqa: F811
+    """Test that service does nothing until it is started."""
+    service = AlertBackgroundService(session_factory=SessionLocalTest)
+    service.wake()
+    asyncio.run(service.stop())
+    assert service.metrics()["queue_depth"] == 0
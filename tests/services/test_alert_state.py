@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+
+from core.config import settings
+from models.models import (AlertStateDB, NotificationDB, WeatherAlertDB,
+                           WeatherCacheDB)
+from services.alert_index import alert_index
+from services.alert_service import AlertBackgroundService, AlertWorkerPool
+from services.alert_state import alert_states
+from tests.main import SessionLocalTest
+from tests.main import test_db as _  # noqa: F401
+from tests.routers.weather.main import make_snapshot
+
+START = datetime(2024, 7, 1)
+
+
+def evaluate(db, temperatures):
+    AlertBackgroundService.add_notifications(db, [
+        {"location": "moscow", "temperature": temperature,
+         "timestamp": START + timedelta(hours=hours)}
+        for hours, temperature in enumerate(temperatures)
+    ])
+    db.commit()
+    return [n.actual_number for n in
+            db.query(NotificationDB).order_by(NotificationDB.timestamp)]
+
+
+def add_alert(db):
+    db.add(WeatherAlertDB(id=1, user_id=1, location="Moscow",
+                          location_key="moscow", column_name="temperature",
+                          comparator=">", number=30))
+    db.commit()
+
+
+def test_edge_triggered(monkeypatch, _):  # noqa: F811
+    """Test notifying only when condition starts to hold."""
+    monkeypatch.setattr(settings, "alert_cooldown_seconds", 0)
+    monkeypatch.setattr(settings, "alert_hysteresis", 2)
+    db = SessionLocalTest()
+    add_alert(db)
+
+    # 29.5 is within hysteresis, so 31 doesn't notify again
+    assert evaluate(db, [31, 32, 33, 29.5, 31, 27, 32]) == [31, 32]
+    state = db.query(AlertStateDB).one()
+    assert state.active
+    assert state.last_notified == START + timedelta(hours=6)
+    db.close()
+
+
+def test_cooldown(monkeypatch, _):  # noqa: F811
+    """Test notifying again once cooldown has passed."""
+    monkeypatch.setattr(settings, "alert_cooldown_seconds", 3 * 3600)
+    db = SessionLocalTest()
+    add_alert(db)
+
+    assert evaluate(db, [31, 32, 33, 34, 35]) == [31, 34]
+    db.close()
+
+
+def test_states_are_loaded(monkeypatch, _):  # noqa: F811
+    """Test that saved states are used after restart."""
+    monkeypatch.setattr(settings, "alert_cooldown_seconds", 0)
+    db = SessionLocalTest()
+    add_alert(db)
+    assert evaluate(db, [31]) == [31]
+
+    alert_states.clear()
+    assert evaluate(db, [32]) == [31]
+    db.close()
+
+
+def test_changes_saved_by_transaction(monkeypatch, _):  # noqa: F811
+    """Test that state change is saved only with its notifications."""
+    monkeypatch.setattr(settings, "alert_cooldown_seconds", 0)
+    db = SessionLocalTest()
+    add_alert(db)
+    db.add(WeatherAlertDB(id=2, user_id=1, location="London",
+                          location_key="london", column_name="temperature",
+                          comparator=">", number=30))
+    db.commit()
+
+    # transaction of moscow evaluates, then fails after london commits
+    moscow = {"location": "moscow", "temperature": 31, "timestamp": START}
+    alert_index.load_many(db, ["moscow"])
+    alert_states.load_many(db, ["moscow"])
+    notify, changes = alert_states.evaluate(
+        moscow, START, alert_index.match(db, moscow)
+    )
+    assert [rule.id for rule, _actual in notify] == list(changes) == [1]
+    AlertBackgroundService.add_notifications(db, [
+        {"location": "london", "temperature": 31, "timestamp": START}
+    ])
+    db.commit()
+    assert db.query(AlertStateDB.alert_id).all() == [(2,)]
+    alert_states.invalidate("moscow")
+
+    pool = AlertWorkerPool(1, SessionLocalTest)
+    rows = [WeatherCacheDB(location=location,
+                           data=make_snapshot(location, temperature, START),
+                           timestamp=START)
+            for location, temperature in (("moscow", 32.0), ("london", 33.0))]
+    db.add_all(rows)
+    db.flush()
+    pool.enqueue(db, rows)
+    db.commit()
+    assert pool.workers[0].process_outbox_batch() == 2
+    assert sorted((n.location, n.actual_number)
+                  for n in db.query(NotificationDB)) == [
+        ("London", 31), ("Moscow", 32)
+    ]
+    db.close()
@@ -0,0 +1,105 @@
+import asyncio
+from datetime import datetime, timezone
+
+from core.config import settings
+from models.models import AlertOutboxDB
+from routers.weather import weather_service
+from services.alert_service import AlertWorkerPool
+from services.process_lock import ProcessLock
+from tests.main import SessionLocalTest
+from tests.main import test_db as _  # noqa: F401
+from tests.routers.weather.main import make_snapshot
+
+
+def store(pool, monkeypatch, locations):
+    monkeypatch.setattr(weather_service, "service", pool)
+    now = datetime.now(timezone.utc)
+    db = SessionLocalTest()
+    weather_service.store_weather_data(db, [
+        make_snapshot(location, 1.0, now) for location in locations
+    ])
+    db.close()
+    weather_service.memory_cache.clear()
+
+
+def test_partitions(monkeypatch, _):  # noqa: F811
+    """Test that data of one location always goes to one partition."""
+    pool = AlertWorkerPool(3, session_factory=SessionLocalTest)
+    woken = []
+    for partition, worker in enumerate(pool.workers):
+        monkeypatch.setattr(worker, "wake",
+                            lambda index=partition: woken.append(index))
+    locations = [f"city {i}" for i in range(30)]
+    store(pool, monkeypatch, locations * 2)
+
+    db = SessionLocalTest()
+    rows = db.query(AlertOutboxDB).all()
+    db.close()
+    assert {pool.partition_of(location) for location in locations} \
+        == {0, 1, 2}
+    assert all(row.partition == pool.partition_of(row.location)
+               for row in rows)
+    assert len(rows) == 60
+    assert sorted(woken) == [0, 1, 2]
+
+
+def test_metrics(monkeypatch, _):  # noqa: F811
+    """Test processing rate of partitions."""
+    async def process():
+        pool = AlertWorkerPool(2, session_factory=SessionLocalTest)
+        await pool.start()
+        store(pool, monkeypatch, [f"city {i}" for i in range(10)])
+        await asyncio.sleep(0)
+        for worker in pool.workers:
+            await worker.input_queue.join()
+        await pool.stop()
+        return pool.metrics()
+
+    metrics = asyncio.run(process())
+    assert [m["partition"] for m in metrics] == [0, 1]
+    assert sum(m["processed"] for m in metrics) == 10
+    assert all(m["queue_depth"] == 0 for m in metrics)
+    assert all(m["outbox_depth"] == 0 for m in metrics)
+    assert sum(m["rate"] for m in metrics) > 0
+
+
+def test_one_process_runs_services(monkeypatch, tmp_path, _):  # noqa: F811
+    """Test that only the pool holding engine lock runs services."""
+    monkeypatch.setattr(settings, "alert_outbox_poll_seconds", 0.01)
+    path = tmp_path / "alert_engine.lock"
+
+    async def elect():
+        first = AlertWorkerPool(1, SessionLocalTest, ProcessLock(path))
+        second = AlertWorkerPool(1, SessionLocalTest, ProcessLock(path))
+        await first.start()
+        await second.start()
+        running = [first.executor is not None, second.executor is not None]
+        await first.stop()
+        await asyncio.sleep(0.1)
+        running += [second.executor is not None]
+        await second.stop()
+        return running
+
+    assert asyncio.run(elect()) == [True, False, True]
+
+
+def test_poll_for_other_processes(monkeypatch, _):  # noqa: F811
+    """Test that outbox is polled only if app runs in several processes."""
+    monkeypatch.setattr(settings, "alert_outbox_poll_seconds", 0.01)
+
+    async def process(web_concurrency):
+        monkeypatch.setattr(settings, "web_concurrency", web_concurrency)
+        pool = AlertWorkerPool(2, session_factory=SessionLocalTest)
+        await pool.start()
+        # snapshots stored by a process that doesn't run services
+        store(AlertWorkerPool(2, session_factory=SessionLocalTest),
+              monkeypatch, [f"city {i}" for i in range(10)])
+        await asyncio.sleep(0.1)
+        db = SessionLocalTest()
+        depth = db.query(AlertOutboxDB).count()
+        db.close()
+        await pool.stop()
+        return depth
+
+    assert asyncio.run(process(1)) == 10
+    assert asyncio.run(process(2)) == 0
@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta, timezone
+
+from core.config import settings
+from models.models import WeatherCacheDB
+from services.archive_service import archive_service
+from services.history_service import HistoryService
+from services.location_service import location_resolver
+from services.retention_service import RetentionService
+from services.stats_service import StatsService
+from tests.main import SessionLocalTest
+from tests.main import test_db as _  # noqa: F401
+from tests.routers.weather.main import make_snapshot
+
+
+def store(db, days_ago):
+    now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    for days, temperature in days_ago:
+        snapshot = make_snapshot("moscow", temperature,
+                                 now - timedelta(days=days))
+        db.add(WeatherCacheDB(location="moscow", data=snapshot,
+                              timestamp=snapshot["timestamp"]))
+    db.commit()
+
+
+def test_archive(monkeypatch, _):  # noqa: F811
+    """Test moving old snapshots to archive and reading them back."""
+    monkeypatch.setattr(settings, "archive_batch_size", 2)
+    monkeypatch.setattr(archive_service, "session_factory",
+                        SessionLocalTest)
+    db = SessionLocalTest()
+    store(db, [(100, 1.0), (70, 2.0), (40, 3.0), (20, 4.0), (1, 5.0)])
+
+    assert archive_service.archive() == 4
+    assert db.query(WeatherCacheDB).count() == 1
+    assert len(list(archive_service.path.rglob("*.parquet"))) >= 3
+
+    temperatures = [snapshot["temperature"] for snapshot in
+                    HistoryService.iter_rows(db, "moscow")]
+    assert temperatures == [1.0, 2.0, 3.0, 4.0, 5.0]
+
+    matrix = StatsService.load(db, "moscow", ["temperature", "humidity"])
+    assert sorted(matrix[:, 0]) == [1.0, 2.0, 3.0, 4.0, 5.0]
+    db.close()
+
+
+def test_get_page_across_archive(monkeypatch, _):  # noqa: F811
+    """Test reading pages of history across archive and db."""
+    monkeypatch.setattr(archive_service, "session_factory",
+                        SessionLocalTest)
+    db = SessionLocalTest()
+    store(db, [(days, float(days)) for days in range(30, 0, -3)])
+    archive_service.archive()
+
+    temperatures, cursor = [], None
+    while True:
+        rows, cursor = HistoryService.get_page(db, "moscow", limit=3,
+                                               cursor=cursor)
+        temperatures += [row.temperature for row in rows]
+        if cursor is None:
+            break
+    assert temperatures == [float(days) for days in range(30, 0, -3)]
+    db.close()
+
+
+def test_retention_of_archive(monkeypatch, _):  # noqa: F811
+    """Test that retention deletes archived snapshots too."""
+    monkeypatch.setattr(archive_service, "session_factory",
+                        SessionLocalTest)
+    db = SessionLocalTest()
+    store(db, [(days, float(days)) for days in (100, 70, 41, 25, 20, 1)])
+    assert archive_service.archive() == 5
+
+    deleted = RetentionService(SessionLocalTest).purge()
+    assert deleted["archive"] == 3
+    temperatures = [snapshot["temperature"] for snapshot in
+                    HistoryService.iter_rows(db, "moscow")]
+    assert temperatures == [25.0, 20.0, 1.0]
+    months = {path.parent for path in archive_service.path.rglob("*.parquet")}
+    assert len(months) == len(list(archive_service.path.glob("*/*")))
+    db.close()
+
+
+def test_move_archive_of_alias(monkeypatch, _):  # noqa: F811
+    """Test that archive of alias is merged into archive of key."""
+    monkeypatch.setattr(archive_service, "session_factory",
+                        SessionLocalTest)
+    db = SessionLocalTest()
+    store(db, [(100, 1.0), (70, 2.0), (1, 5.0)])
+    archive_service.archive()
+    location_resolver.register(db, "Moscow", {"id": 524901})
+    db.commit()
+    location_resolver.clear()
+
+    temperatures = [snapshot["temperature"] for snapshot in
+                    HistoryService.iter_rows(db, "city:524901")]
+    locations = {row.location for row in
+                 archive_service.iter_rows("city:524901")}
+    assert temperatures == [1.0, 2.0, 5.0]
+    assert locations == {"city:524901"}
+    assert not archive_service.location_path("moscow").exists()
+    db.close()
@@ -0,0 +1,37 @@
+import asyncio
+
+from core.config import settings
+from services.election_service import ElectedServices
+from services.process_lock import ProcessLock
+
+
+class Service:
+    def __init__(self):
+        self.running = False
+
+    def start(self):
+        self.running = True
+
+    async def stop(self):
+        self.running = False
+
+
+def test_one_process_runs_services(monkeypatch, tmp_path):
+    """Test that services run only in the process holding the lock."""
+    monkeypatch.setattr(settings, "election_retry_seconds", 0.01)
+    path = tmp_path / "maintenance.lock"
+    first, second = Service(), Service()
+
+    async def elect():
+        elected = [ElectedServices(ProcessLock(path), [service])
+                   for service in (first, second)]
+        for services in elected:
+            services.start()
+        running = [first.running, second.running]
+        await elected[0].stop()
+        await asyncio.sleep(0.1)
+        running += [first.running, second.running]
+        await elected[1].stop()
+        return running + [second.running]
+
+    assert asyncio.run(elect()) == [True, False, False, True, False]
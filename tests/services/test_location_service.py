@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta
+
+from models.models import LocationAliasDB, WeatherCacheDB, WeatherRollupDB
+from services.history_service import HistoryService
+from services.location_service import location_resolver
+from tests.main import SessionLocalTest
+from tests.main import test_db as _  # noqa: F401
+from tests.routers.weather.main import add_snapshot, make_snapshot
+
+maine = {"id": 4975802, "name": "Portland", "sys": {"country": "US"}}
+oregon = {"id": 5746545, "name": "Portland", "sys": {"country": "US"}}
+
+
+def test_register_same_name(_):  # noqa: F811
+    """Test that places sharing name and country keep their own data."""
+    location_resolver.clear()
+    db = SessionLocalTest()
+    first = location_resolver.register(db, "Portland,ME,US", maine)
+    db.commit()
+    add_snapshot(first, 10.0, timedelta(minutes=1))
+    second = location_resolver.register(db, "Portland,OR,US", oregon)
+    db.commit()
+    locations = [row.location for row in db.query(WeatherCacheDB)]
+    db.close()
+    location_resolver.clear()
+
+    assert (first, second) == ("city:4975802", "city:5746545")
+    assert locations == ["city:4975802"]
+    db = SessionLocalTest()
+    assert location_resolver.resolve(db, "portland,me,us") == first
+    assert location_resolver.resolve(db, "portland,or,us") == second
+    db.close()
+
+
+def test_register_coordinates(_):  # noqa: F811
+    """Test that rounded coordinates are key of response without id."""
+    db = SessionLocalTest()
+    key = location_resolver.register(
+        db, "55.7522,37.6156", {"coord": {"lat": 55.7522, "lon": 37.6156}}
+    )
+    db.close()
+    location_resolver.clear()
+
+    assert key == "coord:55.75,37.62"
+
+
+def test_register_moves_name_key(_):  # noqa: F811
+    """Test that data stored under key made of name is moved to id."""
+    location_resolver.clear()
+    db = SessionLocalTest()
+    db.add(LocationAliasDB(alias="moscow", location="moscow,ru"))
+    db.add(LocationAliasDB(alias="moskva", location="moscow,ru"))
+    db.commit()
+    add_snapshot("moscow,ru", 10.0, timedelta(minutes=1))
+    key = location_resolver.register(
+        db, "Moscow", {"id": 524901, "name": "Moscow",
+                       "sys": {"country": "RU"}}
+    )
+    db.commit()
+    locations = [row.location for row in db.query(WeatherCacheDB)]
+    aliases = {row.alias: row.location for row in db.query(LocationAliasDB)}
+    db.close()
+    location_resolver.clear()
+
+    assert key == "city:524901"
+    assert locations == [key]
+    assert aliases == {"moscow": key, "moskva": key, "moscow,ru": key,
+                       key: key}
+
+
+def test_register_merges_rollups(_):  # noqa: F811
+    """Test that rollups of alias are merged into rollups of key."""
+    location_resolver.clear()
+    db = SessionLocalTest()
+    timestamp = datetime(2025, 5, 6, 12, 30)
+    HistoryService.add_to_rollups(db, [
+        make_snapshot("moscow", 10.0, timestamp),
+        make_snapshot("city:524901", 20.0, timestamp),
+        make_snapshot("city:524901", 30.0, timestamp - timedelta(days=1)),
+    ])
+    db.commit()
+    location_resolver.register(db, "Moscow", {"id": 524901})
+    db.commit()
+    rollups = {(row.resolution, row.bucket): row.to_dict()
+               for row in db.query(WeatherRollupDB)}
+    locations = {row.location for row in db.query(WeatherRollupDB)}
+    db.close()
+    location_resolver.clear()
+
+    assert locations == {"city:524901"}
+    assert len(rollups) == 4
+    hour = rollups[("hour", datetime(2025, 5, 6, 12))]
+    assert hour["count"] == 2
+    assert (hour["temperature_min"], hour["temperature_max"]) == (10, 20)
+    assert hour["temperature_mean"] == 15
@@ -0,0 +1,36 @@
+from sqlalchemy import event
+
+from models.models import UserDB
+from services.notification_service import NotificationService
+from tests.main import SessionLocalTest, engine_test
+from tests.main import test_db as _  # noqa: F401
+
+
+def test_notifications_are_read_with_index(_):  # noqa: F811
+    """Test that page and unread count are answered by the index."""
+    db = SessionLocalTest()
+    user = UserDB(username="test_user")
+    db.add(user)
+    db.commit()
+
+    statements = []
+
+    def record(_conn, _cursor, statement, parameters, _context, _many):
+        if "FROM weather_notifications" in statement:
+            statements.append((statement, parameters))
+
+    event.listen(engine_test, "before_cursor_execute", record)
+    try:
+        NotificationService.get_page(db, user.id, 10)
+        NotificationService.count_unread(db, user)
+    finally:
+        event.remove(engine_test, "before_cursor_execute", record)
+
+    assert len(statements) == 2
+    for statement, parameters in statements:
+        plan = " ".join(str(row[-1]) for row in db.connection()
+                        .exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}",
+                                         parameters))
+        assert "ix_weather_notifications_user_id_id" in plan
+        assert "SCAN" not in plan
+    db.close()
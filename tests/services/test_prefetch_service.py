@@ -0,0 +1,68 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from core.config import settings
+from models.models import SavedLocationDB, UserDB, WeatherCacheDB
+from routers.weather import weather_service
+from services.prefetch_service import PrefetchService
+from tests.main import SessionLocalTest
+from tests.main import test_db as _  # noqa: F401
+from tests.routers.weather.main import mocked_cities_request
+
+
+@pytest.fixture()
+def upstream_calls(monkeypatch):
+    calls = []
+
+    async def counting_request(client, url, params=None, **kwargs):
+        calls.append(params.get("q"))
+        return await mocked_cities_request(client, url, params)
+
+    weather_service.memory_cache.clear()
+    monkeypatch.setattr(settings, "prefetch_spread_seconds", 0)
+    monkeypatch.setattr("httpx.AsyncClient.get", counting_request)
+    yield calls
+    weather_service.memory_cache.clear()
+
+
+def save_locations(db, locations):
+    for user_id in (1, 2):
+        db.add(UserDB(id=user_id, username=f"user_{user_id}"))
+        for location in locations:
+            db.add(SavedLocationDB(user_id=user_id, location=location,
+                                   location_key=location.lower()))
+    db.commit()
+
+
+def test_due_locations(_):  # noqa: F811
+    """Test selecting saved locations that are about to expire."""
+    db = SessionLocalTest()
+    save_locations(db, ["Moscow", "London", "Paris"])
+    now = datetime.now(timezone.utc)
+    for location, age in (("moscow", 1), ("london", 29)):
+        timestamp = now - timedelta(minutes=age)
+        db.add(WeatherCacheDB(location=location,
+                              data={"timestamp": timestamp},
+                              timestamp=timestamp))
+    db.commit()
+
+    prefetch = PrefetchService(weather_service, SessionLocalTest)
+    assert sorted(prefetch.due_locations(db)) == ["london", "paris"]
+    db.close()
+
+
+def test_refresh_due(upstream_calls, _):  # noqa: F811
+    """Test that each distinct due location is refreshed once."""
+    db = SessionLocalTest()
+    save_locations(db, ["Moscow", "London"])
+
+    prefetch = PrefetchService(weather_service, SessionLocalTest)
+    asyncio.run(prefetch.refresh_due())
+    assert sorted(upstream_calls) == ["london", "moscow"]
+    assert db.query(WeatherCacheDB).count() == 2
+
+    asyncio.run(prefetch.refresh_due())
+    assert len(upstream_calls) == 2
+    db.close()
@@ -0,0 +1,15 @@
+from services.process_lock import ProcessLock
+
+
+def test_lock_is_held_by_one_owner(tmp_path):
+    """Test that lock can't be taken again until it is released."""
+    path = tmp_path / "engine.lock"
+    first, second = ProcessLock(path), ProcessLock(path)
+
+    assert first.acquire()
+    assert first.acquire()
+    assert not second.acquire()
+    first.release()
+    assert second.acquire()
+    assert (first.held, second.held) == (False, True)
+    second.release()
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from core.config import settings
+from core.database import Base
+from models.models import NotificationDB, WeatherCacheDB, WeatherRollupDB
+from services.history_service import HistoryService
+from services.retention_service import RetentionService
+from tests.main import SessionLocalTest
+from tests.main import test_db as _  # noqa: F401
+from tests.routers.weather.main import make_snapshot
+
+
+def test_purge(monkeypatch, _):  # noqa: F811
+    """Test that only rows older than their retention are deleted."""
+    monkeypatch.setattr(settings, "retention_batch_size", 2)
+    db = SessionLocalTest()
+    now = datetime.utcnow()
+    snapshots = [make_snapshot("moscow", 10.0, now - timedelta(days=days))
+                 for days in (1, 40, 41, 42, 400)]
+    db.add_all([WeatherCacheDB(location="moscow", data=snapshot,
+                               timestamp=snapshot["timestamp"])
+                for snapshot in snapshots])
+    HistoryService.add_to_rollups(db, snapshots)
+    db.add_all([NotificationDB(user_id=1, location="moscow",
+                               column_name="temperature", comparator=">",
+                               number=0, actual_number=10,
+                               timestamp=now - timedelta(days=days))
+                for days in (1, 100)])
+    db.commit()
+
+    deleted = RetentionService(SessionLocalTest).purge()
+    assert deleted == {"weather_cache": 4, "weather_rollups": 1,
+                       "weather_notifications": 1, "archive": 0}
+    assert db.query(WeatherCacheDB).count() == 1
+    assert db.query(NotificationDB).count() == 1
+    resolutions = [resolution for (resolution,) in
+                   db.query(WeatherRollupDB.resolution)]
+    assert resolutions.count("day") == 5
+    assert resolutions.count("hour") == 4
+    db.close()
+
+
+def test_purge_returns_free_pages(tmp_path):
+    """Test that all pages freed by purge are returned to file system."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'weather.db'}")
+    with engine.connect() as connection:
+        connection.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine)
+
+    db = session_factory()
+    old = datetime.utcnow() - timedelta(days=100)
+    db.add_all([WeatherCacheDB(location="moscow", data={"text": "x" * 1000},
+                               timestamp=old) for _row in range(1000)])
+    db.commit()
+
+    def pragma(name):
+        return db.connection().exec_driver_sql(f"PRAGMA {name}").scalar()
+
+    pages = pragma("page_count")
+    RetentionService(session_factory).purge()
+    assert pragma("freelist_count") == 0
+    assert pragma("page_count") < pages / 2
+    db.close()
+    engine.dispose()